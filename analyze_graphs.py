@@ -5,7 +5,8 @@ This script queries the Neo4j graph to extract structural features
 that may differentiate between GAD, ADHD, and Wernicke's Aphasia.
 
 Usage:
-    python analyze_graphs.py
+    python analyze_graphs.py              # Query Neo4j and report
+    python analyze_graphs.py --cached     # Reuse cached query results if the graph is unchanged
 
 The analysis compares:
 - Clinical vs Semantic entity counts
@@ -14,10 +15,18 @@ The analysis compares:
 - Entity patterns by disorder type
 """
 
+import io
 import os
+import sys
 import json
+import pickle
+import functools
 from datetime import datetime
+from dataclasses import dataclass, field
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import NamedTuple
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
 
@@ -27,6 +36,22 @@ load_dotenv()
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password123")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+
+# Shared driver (owns the connection pool), see get_driver()
+_driver = None
+
+# On-disk cache of query results for --cached runs. Bump CACHE_VERSION when
+# the shape of the cached data changes so old pickles are ignored.
+CACHE_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "chat2graph",
+)
+CACHE_VERSION = 4
+
+# How many entities per disorder the report lists
+CLINICAL_SAMPLE_SIZE = 15
+SEMANTIC_SAMPLE_SIZE = 10
 
 # Static map for known conversation names to disorder categories
 # New episodes uploaded via API will have their disorder stored in Neo4j
@@ -41,156 +66,220 @@ CONVERSATION_DISORDERS = {
 }
 
 
+# Cypher used by the analysis. Kept as module-level constants so every call
+# sends identical text (one cached plan per query); values go in as parameters.
+
+# Entity-to-entity relationship types, i.e. everything except MENTIONS.
+# Fetched once and passed to the queries below as $rel_types.
+RELATIONSHIP_TYPES_QUERY = """
+    CALL db.relationshipTypes() YIELD relationshipType
+    WHERE relationshipType <> 'MENTIONS'
+    RETURN collect(relationshipType) AS rel_types
+"""
+
+# Disorder per episode, resolved server-side: the diagnosis stored on the
+# episode wins, then the static map passed in as $known, then 'Unknown'.
+EPISODE_DISORDERS_QUERY = """
+    MATCH (e:Episode)
+    WITH e, $known[e.name] AS known,
+         e.diagnosis IS NOT NULL AND e.diagnosis <> '' AS has_diagnosis
+    RETURN e.name AS name,
+           CASE WHEN has_diagnosis THEN e.diagnosis
+                ELSE coalesce(known[0], 'Unknown') END AS disorder,
+           CASE WHEN has_diagnosis THEN coalesce(e.meets_criteria, false)
+                ELSE coalesce(known[1], false) END AS meets
+"""
+
+OVERALL_STATS_QUERY = """
+    CALL { MATCH (n:Entity) RETURN count(n) AS total_entities }
+    CALL { MATCH (n:Clinical) RETURN count(n) AS clinical_count }
+    CALL { MATCH (n:Semantic) RETURN count(n) AS semantic_count }
+    CALL { MATCH ()-[r]->() RETURN count(r) AS total_rels }
+    CALL { MATCH (e:Episode) RETURN count(e) AS episode_count }
+    RETURN total_entities, clinical_count, semantic_count, total_rels, episode_count
+"""
+
+# Cheap graph-state stamp for --cached runs: node and relationship counts
+# plus the latest episode write (extract_clinical.py sets e.updated_at)
+GRAPH_FINGERPRINT_QUERY = """
+    CALL { MATCH (n) RETURN count(n) AS nodes }
+    CALL { MATCH ()-[r]->() RETURN count(r) AS rels }
+    CALL { MATCH (e:Episode) RETURN max(e.updated_at) AS updated_at }
+    RETURN nodes, rels, updated_at
+"""
+
+# Everything per episode in one round trip: entity lists plus the
+# relationship counts among those entities. The far end of each edge is
+# checked with a MENTIONS pattern (expand-into) rather than a list scan.
+EPISODE_STATS_QUERY = """
+    MATCH (e:Episode)
+    OPTIONAL MATCH (e)-[:MENTIONS]->(n:Entity)
+    WITH e, collect(DISTINCT n) AS nodes
+    CALL {
+        WITH e, nodes
+        UNWIND nodes AS a
+        MATCH (a)-[r]->(b:Entity)
+        WHERE type(r) IN $rel_types AND a <> b AND (e)-[:MENTIONS]->(b)
+        RETURN count(CASE WHEN a:Clinical AND b:Clinical THEN r END) AS clinical_rels,
+               count(CASE WHEN a:Semantic AND b:Semantic THEN r END) AS semantic_rels,
+               count(CASE WHEN (a:Clinical AND b:Semantic) OR (a:Semantic AND b:Clinical)
+                          THEN r END) AS cross_rels
+    }
+    RETURN e.name AS name,
+           [n IN nodes WHERE n:Clinical | [n.name, n.type]] AS clinical_entities,
+           [n IN nodes WHERE n:Semantic | [n.name, n.type]] AS semantic_entities,
+           clinical_rels, semantic_rels, cross_rels
+"""
+
+# Entity samples per disorder for the report: the first entities in
+# (name, type) order plus the distinct total, so only the sample is shipped.
+# Each episode is an index seek on its name.
+ENTITIES_BY_DISORDER_QUERY = """
+    UNWIND $mapping AS row
+    WITH row.disorder AS disorder, collect(row.episode) AS episodes
+    CALL {
+        WITH episodes
+        UNWIND episodes AS episode
+        MATCH (:Episode {name: episode})-[:MENTIONS]->(n:Clinical)
+        WITH DISTINCT n.name AS name, n.type AS type
+        ORDER BY name, type
+        RETURN collect([name, type])[..$clinical_limit] AS clinical, count(*) AS clinical_total
+    }
+    CALL {
+        WITH episodes
+        UNWIND episodes AS episode
+        MATCH (:Episode {name: episode})-[:MENTIONS]->(n:Semantic)
+        WITH DISTINCT n.name AS name, n.type AS type
+        ORDER BY name, type
+        RETURN collect([name, type])[..$semantic_limit] AS semantic, count(*) AS semantic_total
+    }
+    RETURN disorder, clinical, clinical_total, semantic, semantic_total
+"""
+
+# Start from the entity-to-entity relationships (far fewer than the MENTIONS
+# pairs per episode) and only then resolve the episode that mentions both ends
+RELATIONSHIPS_BY_EPISODE_QUERY = """
+    MATCH (n1:Entity)-[r]->(n2:Entity)
+    WHERE type(r) IN $rel_types AND n1 <> n2
+    MATCH (e:Episode)-[:MENTIONS]->(n1)
+    MATCH (e)-[:MENTIONS]->(n2)
+    RETURN e.name as episode,
+           collect([n1.name, n2.name, type(r), r.description]) as rels
+"""
+
 def get_all_episode_disorders(driver):
     """
     Get disorder info for all episodes from Neo4j.
     Merges static CONVERSATION_DISORDERS with data from Neo4j.
     """
     disorders = dict(CONVERSATION_DISORDERS)
+    known = {name: list(info) for name, info in CONVERSATION_DISORDERS.items()}
 
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (e:Episode)
-            RETURN e.name as name, e.diagnosis as diagnosis, e.meets_criteria as meets_criteria
-        """)
-        for record in result:
-            name = record["name"]
-            diagnosis = record["diagnosis"]
-            meets = record["meets_criteria"]
-
-            # Update or add episode disorder info
-            if diagnosis:
-                disorders[name] = (diagnosis, meets if meets is not None else False)
-            elif name not in disorders:
-                disorders[name] = ("Unknown", False)
+    with _session(driver) as session:
+        result = session.run(EPISODE_DISORDERS_QUERY, known=known)
+        disorders.update((name, (disorder, meets)) for name, disorder, meets in result)
 
     return disorders
 
 
 def get_driver():
-    """Create Neo4j driver."""
-    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    """Get the shared Neo4j driver, creating it on first use."""
+    global _driver
+    if _driver is None:
+        _driver = GraphDatabase.driver(
+            NEO4J_URI,
+            auth=(NEO4J_USER, NEO4J_PASSWORD),
+            max_connection_pool_size=32,     # comfortably above the concurrent reads in main()
+            connection_acquisition_timeout=60,
+            max_connection_lifetime=1000,
+            keep_alive=True,
+        )
+    return _driver
+
+
+def _session(driver):
+    """Open a session on the configured database (skips home-db resolution)."""
+    # Analysis reads pull whole result sets; fetch them in fewer, larger batches
+    return driver.session(database=NEO4J_DATABASE, fetch_size=10000)
+
+
+def close_driver():
+    """Close the shared Neo4j driver if it was created."""
+    global _driver
+    if _driver is not None:
+        _driver.close()
+        _driver = None
+
+
+def get_relationship_types(driver):
+    """Get the entity-to-entity relationship types present in the graph."""
+    with _session(driver) as session:
+        return session.run(RELATIONSHIP_TYPES_QUERY).single()["rel_types"]
 
 
 def get_overall_stats(driver):
     """Get overall graph statistics."""
-    with driver.session() as session:
-        # Total entities
-        result = session.run("MATCH (n:Entity) RETURN count(n) as count")
-        total_entities = result.single()["count"]
-        
-        # Clinical entities
-        result = session.run("MATCH (n:Clinical) RETURN count(n) as count")
-        clinical_count = result.single()["count"]
-        
-        # Semantic entities
-        result = session.run("MATCH (n:Semantic) RETURN count(n) as count")
-        semantic_count = result.single()["count"]
-        
-        # Total relationships
-        result = session.run("MATCH ()-[r]->() RETURN count(r) as count")
-        total_rels = result.single()["count"]
-        
-        # Episodes
-        result = session.run("MATCH (e:Episode) RETURN count(e) as count")
-        episode_count = result.single()["count"]
+    with _session(driver) as session:
+        # All five counts in one round trip
+        result = session.run(OVERALL_STATS_QUERY)
+        record = result.single()
         
         return {
-            "total_entities": total_entities,
-            "clinical_entities": clinical_count,
-            "semantic_entities": semantic_count,
-            "total_relationships": total_rels,
-            "episodes": episode_count
+            "total_entities": record["total_entities"],
+            "clinical_entities": record["clinical_count"],
+            "semantic_entities": record["semantic_count"],
+            "total_relationships": record["total_rels"],
+            "episodes": record["episode_count"]
         }
 
 
-def get_entities_per_episode(driver):
-    """Get clinical and semantic entity counts per episode with density breakdown."""
+def _density(edges, possible):
+    """Edges over possible edges, 0 when no edge is possible."""
+    return edges / possible if possible else 0
+
+
+def get_all_episode_stats(driver, rel_types=None):
+    """
+    Get per-episode entity counts with density breakdown, plus the clinical
+    and semantic entity lists, from a single query.
+    Returns (entities_per_ep, clinical_by_ep, semantic_by_ep).
+    """
     results = {}
+    clinical_by_ep = {}
+    semantic_by_ep = {}
+    if rel_types is None:
+        rel_types = get_relationship_types(driver)
     
-    with driver.session() as session:
-        # Get all episodes
-        episodes = session.run("MATCH (e:Episode) RETURN e.name as name")
-        episode_names = [r["name"] for r in episodes]
+    with _session(driver) as session:
+        # One round trip for every episode: collect each episode's entities
+        # once, then classify every relationship among them in a single expansion
+        result = session.run(EPISODE_STATS_QUERY, rel_types=rel_types)
         
-        for ep_name in episode_names:
-            # Clinical count
-            result = session.run("""
-                MATCH (e:Episode {name: $name})-[:MENTIONS]->(n:Clinical)
-                RETURN count(n) as count
-            """, name=ep_name)
-            clinical = result.single()["count"]
-            
-            # Semantic count
-            result = session.run("""
-                MATCH (e:Episode {name: $name})-[:MENTIONS]->(n:Semantic)
-                RETURN count(n) as count
-            """, name=ep_name)
-            semantic = result.single()["count"]
-            
-            # Clinical-to-Clinical relationships
-            result = session.run("""
-                MATCH (e:Episode {name: $name})-[:MENTIONS]->(n1:Clinical)
-                MATCH (e)-[:MENTIONS]->(n2:Clinical)
-                MATCH (n1)-[r]->(n2)
-                WHERE n1 <> n2 AND NOT type(r) = 'MENTIONS'
-                RETURN count(DISTINCT r) as count
-            """, name=ep_name)
-            clinical_rels = result.single()["count"]
-            
-            # Semantic-to-Semantic relationships
-            result = session.run("""
-                MATCH (e:Episode {name: $name})-[:MENTIONS]->(n1:Semantic)
-                MATCH (e)-[:MENTIONS]->(n2:Semantic)
-                MATCH (n1)-[r]->(n2)
-                WHERE n1 <> n2 AND NOT type(r) = 'MENTIONS'
-                RETURN count(DISTINCT r) as count
-            """, name=ep_name)
-            semantic_rels = result.single()["count"]
-            
-            # Cross-type relationships (Clinical <-> Semantic)
-            result = session.run("""
-                MATCH (e:Episode {name: $name})-[:MENTIONS]->(n1:Clinical)
-                MATCH (e)-[:MENTIONS]->(n2:Semantic)
-                MATCH (n1)-[r]-(n2)
-                WHERE NOT type(r) = 'MENTIONS'
-                RETURN count(DISTINCT r) as count
-            """, name=ep_name)
-            cross_rels = result.single()["count"]
+        for record in result:
+            ep_name = record["name"]
+            clinical_by_ep[ep_name] = record["clinical_entities"]
+            semantic_by_ep[ep_name] = record["semantic_entities"]
+            clinical = len(clinical_by_ep[ep_name])
+            semantic = len(semantic_by_ep[ep_name])
+            clinical_rels = record["clinical_rels"]
+            semantic_rels = record["semantic_rels"]
+            cross_rels = record["cross_rels"]
             
             # Total relationship count
             total_rels = clinical_rels + semantic_rels + cross_rels
             
-            # Calculate densities
-            # Clinical density: edges / possible edges within clinical nodes
-            clinical_density = 0
-            if clinical > 1:
-                possible_clinical = clinical * (clinical - 1)
-                clinical_density = clinical_rels / possible_clinical if possible_clinical > 0 else 0
-            
-            # Semantic density: edges / possible edges within semantic nodes
-            semantic_density = 0
-            if semantic > 1:
-                possible_semantic = semantic * (semantic - 1)
-                semantic_density = semantic_rels / possible_semantic if possible_semantic > 0 else 0
-            
-            # Cross-type density: cross edges / possible cross edges
-            cross_density = 0
-            if clinical > 0 and semantic > 0:
-                possible_cross = clinical * semantic * 2  # bidirectional
-                cross_density = cross_rels / possible_cross if possible_cross > 0 else 0
-            
-            # Overall density
+            # Densities: edges / possible directed edges. Each product is zero
+            # whenever the group is too small, so one guard covers every case.
             total_nodes = clinical + semantic
-            overall_density = 0
-            if total_nodes > 1:
-                possible_total = total_nodes * (total_nodes - 1)
-                overall_density = total_rels / possible_total if possible_total > 0 else 0
+            clinical_density = _density(clinical_rels, clinical * (clinical - 1))
+            semantic_density = _density(semantic_rels, semantic * (semantic - 1))
+            cross_density = _density(cross_rels, clinical * semantic * 2)  # bidirectional
+            overall_density = _density(total_rels, total_nodes * (total_nodes - 1))
             
             results[ep_name] = {
                 "clinical": clinical,
                 "semantic": semantic,
-                "total": clinical + semantic,
+                "total": total_nodes,
                 "relationships": total_rels,
                 "clinical_rels": clinical_rels,
                 "semantic_rels": semantic_rels,
@@ -201,127 +290,154 @@ def get_entities_per_episode(driver):
                 "overall_density": overall_density
             }
     
-    return results
+    return results, clinical_by_ep, semantic_by_ep
 
 
-def get_clinical_entities_by_episode(driver):
-    """Get list of clinical entity names per episode."""
+def get_entities_by_disorder(driver, episode_disorders):
+    """
+    Get a sample of the distinct (name, type) clinical and semantic entities
+    per disorder, in sorted order, along with the distinct totals.
+    """
     results = {}
+    mapping = [
+        {"episode": episode, "disorder": disorder}
+        for episode, (disorder, _) in episode_disorders.items()
+    ]
     
-    with driver.session() as session:
-        query = """
-        MATCH (e:Episode)-[:MENTIONS]->(n:Clinical)
-        RETURN e.name as episode, collect(n.name) as entities, collect(n.type) as types
-        """
-        result = session.run(query)
-        for r in result:
-            results[r["episode"]] = list(zip(r["entities"], r["types"]))
+    with _session(driver) as session:
+        # Deduplicate, sort and trim each disorder's entities server-side
+        result = session.run(
+            ENTITIES_BY_DISORDER_QUERY,
+            mapping=mapping,
+            clinical_limit=CLINICAL_SAMPLE_SIZE,
+            semantic_limit=SEMANTIC_SAMPLE_SIZE,
+        )
+        for disorder, clinical, clinical_total, semantic, semantic_total in result:
+            results[disorder] = {
+                "clinical": clinical,
+                "clinical_total": clinical_total,
+                "semantic": semantic,
+                "semantic_total": semantic_total,
+            }
     
     return results
 
 
-def get_semantic_entities_by_episode(driver):
-    """Get list of semantic entity names per episode."""
-    results = {}
-    
-    with driver.session() as session:
-        query = """
-        MATCH (e:Episode)-[:MENTIONS]->(n:Semantic)
-        RETURN e.name as episode, collect(n.name) as entities, collect(n.type) as types
-        """
-        result = session.run(query)
-        for r in result:
-            results[r["episode"]] = list(zip(r["entities"], r["types"]))
-    
-    return results
+class Relationship(NamedTuple):
+    """An entity-to-entity relationship within an episode."""
+    source: str
+    target: str
+    type: str
+    description: str | None
 
 
-def get_relationships_by_episode(driver):
+def get_relationships_by_episode(driver, rel_types=None):
     """Get relationships for each episode."""
-    results = {}
-    
-    with driver.session() as session:
-        query = """
-        MATCH (e:Episode)-[:MENTIONS]->(n1:Entity)
-        MATCH (e)-[:MENTIONS]->(n2:Entity)
-        MATCH (n1)-[r]->(n2)
-        WHERE n1 <> n2 AND NOT type(r) = 'MENTIONS'
-        RETURN e.name as episode, n1.name as from_node, n2.name as to_node, 
-               type(r) as rel_type, r.description as description
-        """
-        result = session.run(query)
-        for r in result:
-            ep = r["episode"]
-            if ep not in results:
-                results[ep] = []
-            results[ep].append({
-                "from": r["from_node"],
-                "to": r["to_node"],
-                "type": r["rel_type"],
-                "description": r["description"]
-            })
+    if rel_types is None:
+        rel_types = get_relationship_types(driver)
     
-    return results
+    with _session(driver) as session:
+        # Group server-side so each record is one episode's relationship list
+        result = session.run(RELATIONSHIPS_BY_EPISODE_QUERY, rel_types=rel_types)
+        return {episode: [Relationship(*rel) for rel in rels] for episode, rels in result}
+
+
+def group_episodes_by_disorder(episode_disorders):
+    """Map each disorder to its episode names (one pass over the disorder map)."""
+    episodes_by_disorder = defaultdict(list)
+    for episode, (disorder, _) in episode_disorders.items():
+        episodes_by_disorder[disorder].append(episode)
+    return dict(episodes_by_disorder)
+
+
+@dataclass(slots=True)
+class DisorderAgg:
+    """Running per-disorder totals; averages are taken in summarize_by_disorder()."""
+    episodes: list = field(default_factory=list)
+    clinical: int = 0
+    semantic: int = 0
+    total: int = 0
+    relationships: int = 0
+    clinical_density: float = 0
+    semantic_density: float = 0
+    cross_density: float = 0
+    overall_density: float = 0
+    meets_count: int = 0
+
+    def add(self, episode, ep_data, meets):
+        self.episodes.append(episode)
+        self.clinical += ep_data["clinical"]
+        self.semantic += ep_data["semantic"]
+        self.total += ep_data["total"]
+        self.relationships += ep_data["relationships"]
+        self.clinical_density += ep_data.get("clinical_density", 0)
+        self.semantic_density += ep_data.get("semantic_density", 0)
+        self.cross_density += ep_data.get("cross_density", 0)
+        self.overall_density += ep_data.get("overall_density", 0)
+        if meets:
+            self.meets_count += 1
 
 
 def analyze_by_disorder(entities_per_ep, episode_disorders=None):
     """Aggregate metrics by disorder type."""
-    by_disorder = defaultdict(lambda: {
-        "episodes": [],
-        "clinical_counts": [],
-        "semantic_counts": [],
-        "total_counts": [],
-        "relationship_counts": [],
-        "clinical_densities": [],
-        "semantic_densities": [],
-        "cross_densities": [],
-        "overall_densities": [],
-        "meets_criteria": []
-    })
-
-    default_ep = {
-        "clinical": 0, "semantic": 0, "total": 0, "relationships": 0,
-        "clinical_density": 0, "semantic_density": 0, "cross_density": 0, "overall_density": 0
-    }
+    by_disorder = {}
 
     # Use provided episode_disorders or fall back to static CONVERSATION_DISORDERS
     disorders_map = episode_disorders if episode_disorders else CONVERSATION_DISORDERS
 
     # Process all episodes that have data
-    for episode in entities_per_ep.keys():
-        disorder_info = disorders_map.get(episode, ("Unknown", False))
-        disorder, meets = disorder_info
+    for episode, ep_data in entities_per_ep.items():
+        disorder, meets = disorders_map.get(episode, ("Unknown", False))
+
+        agg = by_disorder.get(disorder)
+        if agg is None:
+            agg = by_disorder[disorder] = DisorderAgg()
+        agg.add(episode, ep_data, meets)
+
+    return by_disorder
 
-        ep_data = entities_per_ep.get(episode, default_ep)
 
-        by_disorder[disorder]["episodes"].append(episode)
-        by_disorder[disorder]["clinical_counts"].append(ep_data["clinical"])
-        by_disorder[disorder]["semantic_counts"].append(ep_data["semantic"])
-        by_disorder[disorder]["total_counts"].append(ep_data["total"])
-        by_disorder[disorder]["relationship_counts"].append(ep_data["relationships"])
-        by_disorder[disorder]["clinical_densities"].append(ep_data.get("clinical_density", 0))
-        by_disorder[disorder]["semantic_densities"].append(ep_data.get("semantic_density", 0))
-        by_disorder[disorder]["cross_densities"].append(ep_data.get("cross_density", 0))
-        by_disorder[disorder]["overall_densities"].append(ep_data.get("overall_density", 0))
-        by_disorder[disorder]["meets_criteria"].append(meets)
+def summarize_by_disorder(by_disorder):
+    """Compute the per-disorder averages once for reporting and export."""
+    summary = {}
+    for disorder, data in by_disorder.items():
+        count = len(data.episodes)
+        avg_clinical = data.clinical / count
+        avg_semantic = data.semantic / count
+        avg_total = avg_clinical + avg_semantic
+        summary[disorder] = {
+            "episode_count": count,
+            "meets_count": data.meets_count,
+            "avg_clinical": avg_clinical,
+            "avg_semantic": avg_semantic,
+            "avg_ratio": avg_clinical / avg_total if avg_total > 0 else 0,
+            "avg_relationships": data.relationships / count,
+            "avg_clinical_density": data.clinical_density / count,
+            "avg_semantic_density": data.semantic_density / count,
+            "avg_cross_density": data.cross_density / count,
+            "avg_overall_density": data.overall_density / count,
+        }
+    return summary
 
-    return dict(by_disorder)
 
+def print_analysis(overall, entities_per_ep, entities_by_disorder, rels_by_ep, summary, episode_disorders=None):
+    """Print the analysis results. summary comes from summarize_by_disorder()."""
 
-def print_analysis(overall, entities_per_ep, clinical_by_ep, semantic_by_ep, rels_by_ep, episode_disorders=None):
-    """Print the analysis results."""
+    # Build the report in memory and write it to stdout once
+    buf = io.StringIO()
+    out = functools.partial(print, file=buf)
 
     # Use provided episode_disorders or fall back to static CONVERSATION_DISORDERS
     disorders_map = episode_disorders if episode_disorders else CONVERSATION_DISORDERS
 
-    print("=" * 75)
-    print("  CLINICAL KNOWLEDGE GRAPH ANALYSIS")
-    print("  Comparing Clinical vs Semantic Entities by Disorder")
-    print("=" * 75)
+    out("=" * 75)
+    out("  CLINICAL KNOWLEDGE GRAPH ANALYSIS")
+    out("  Comparing Clinical vs Semantic Entities by Disorder")
+    out("=" * 75)
 
     # Overall stats
     clinical_ratio = overall['clinical_entities'] / overall['total_entities'] if overall['total_entities'] > 0 else 0
-    print(f"""
+    out(f"""
 OVERALL STATISTICS:
   Total Entities: {overall['total_entities']}
     - Clinical: {overall['clinical_entities']} ({clinical_ratio:.1%})
@@ -331,153 +447,119 @@ OVERALL STATISTICS:
 """)
 
     # Per-episode table
-    print("-" * 75)
-    print("PER-CONVERSATION METRICS:")
-    print("-" * 75)
-    print(f"{'Conversation':<32} {'Disorder':<10} {'Clinical':<10} {'Semantic':<10} {'Ratio':<10} {'Rels':<8}")
-    print("-" * 75)
-
-    for episode in sorted(entities_per_ep.keys()):
+    out("-" * 75)
+    out("PER-CONVERSATION METRICS:")
+    out("-" * 75)
+    out(f"{'Conversation':<32} {'Disorder':<10} {'Clinical':<10} {'Semantic':<10} {'Ratio':<10} {'Rels':<8}")
+    out("-" * 75)
+
+    rows = []
+    for episode, ep_data in sorted(entities_per_ep.items()):
         disorder, meets = disorders_map.get(episode, ("Unknown", False))
-        ep_data = entities_per_ep.get(episode, {"clinical": 0, "semantic": 0, "total": 0, "relationships": 0})
+        clinical, semantic = ep_data["clinical"], ep_data["semantic"]
 
-        total = ep_data["clinical"] + ep_data["semantic"]
-        ratio = ep_data["clinical"] / total if total > 0 else 0
-        ratio_str = f"{ratio:.0%}"
+        total = clinical + semantic
+        ratio_str = f"{clinical / total if total > 0 else 0:.0%}"
 
         meets_marker = "*" if meets else ""
-        print(f"{episode:<32} {disorder:<10} {ep_data['clinical']:<10} {ep_data['semantic']:<10} {ratio_str:<10} {ep_data['relationships']:<8}{meets_marker}")
+        rows.append(f"{episode:<32} {disorder:<10} {clinical:<10} {semantic:<10} {ratio_str:<10} {ep_data['relationships']:<8}{meets_marker}")
+    if rows:
+        out("\n".join(rows))
 
-    print("\n  * = meets diagnostic criteria")
+    out("\n  * = meets diagnostic criteria")
 
     # Aggregate by disorder
-    print("\n" + "-" * 75)
-    print("AGGREGATED BY DISORDER:")
-    print("-" * 75)
+    out("\n" + "-" * 75)
+    out("AGGREGATED BY DISORDER:")
+    out("-" * 75)
 
-    by_disorder = analyze_by_disorder(entities_per_ep, episode_disorders)
+    episodes_by_disorder = group_episodes_by_disorder(disorders_map)
     
-    for disorder, data in by_disorder.items():
-        avg_clinical = sum(data["clinical_counts"]) / len(data["clinical_counts"]) if data["clinical_counts"] else 0
-        avg_semantic = sum(data["semantic_counts"]) / len(data["semantic_counts"]) if data["semantic_counts"] else 0
-        avg_total = avg_clinical + avg_semantic
-        avg_ratio = avg_clinical / avg_total if avg_total > 0 else 0
-        avg_rels = sum(data["relationship_counts"]) / len(data["relationship_counts"]) if data["relationship_counts"] else 0
-        
-        # Density by type (use stored values)
-        avg_clinical_density = sum(data["clinical_densities"]) / len(data["clinical_densities"]) if data["clinical_densities"] else 0
-        avg_semantic_density = sum(data["semantic_densities"]) / len(data["semantic_densities"]) if data["semantic_densities"] else 0
-        avg_cross_density = sum(data["cross_densities"]) / len(data["cross_densities"]) if data["cross_densities"] else 0
-        avg_overall_density = sum(data["overall_densities"]) / len(data["overall_densities"]) if data["overall_densities"] else 0
-        
-        meets_count = sum(1 for m in data["meets_criteria"] if m)
-        total_count = len(data["meets_criteria"])
-        
-        print(f"""
+    for disorder, s in summary.items():
+        out(f"""
 {disorder}:
-  Conversations: {total_count} ({meets_count} meet criteria)
-  Avg Clinical Entities: {avg_clinical:.1f}
-  Avg Semantic Entities: {avg_semantic:.1f}
-  Avg Clinical Ratio: {avg_ratio:.1%}
-  Avg Relationships: {avg_rels:.1f}
+  Conversations: {s['episode_count']} ({s['meets_count']} meet criteria)
+  Avg Clinical Entities: {s['avg_clinical']:.1f}
+  Avg Semantic Entities: {s['avg_semantic']:.1f}
+  Avg Clinical Ratio: {s['avg_ratio']:.1%}
+  Avg Relationships: {s['avg_relationships']:.1f}
   
   Density by Entity Type:
-    Clinical-to-Clinical: {avg_clinical_density:.3f}
-    Semantic-to-Semantic: {avg_semantic_density:.3f}
-    Cross-type (Clin<->Sem): {avg_cross_density:.3f}
-    Overall: {avg_overall_density:.3f}
+    Clinical-to-Clinical: {s['avg_clinical_density']:.3f}
+    Semantic-to-Semantic: {s['avg_semantic_density']:.3f}
+    Cross-type (Clin<->Sem): {s['avg_cross_density']:.3f}
+    Overall: {s['avg_overall_density']:.3f}
 """)
     
     # Clinical entities by disorder
-    print("-" * 75)
-    print("CLINICAL ENTITIES BY DISORDER:")
-    print("-" * 75)
+    out("-" * 75)
+    out("CLINICAL ENTITIES BY DISORDER:")
+    out("-" * 75)
     
-    for disorder in by_disorder.keys():
-        print(f"\n{disorder}:")
-        all_clinical = set()
-        for episode, (ep_disorder, _) in CONVERSATION_DISORDERS.items():
-            if ep_disorder == disorder and episode in clinical_by_ep:
-                for name, etype in clinical_by_ep[episode]:
-                    all_clinical.add((name, etype))
+    for disorder in summary:
+        out(f"\n{disorder}:")
+        entities = entities_by_disorder.get(disorder, {})
         
-        for name, etype in sorted(all_clinical)[:15]:
-            print(f"  - {name} ({etype})")
-        if len(all_clinical) > 15:
-            print(f"  ... and {len(all_clinical) - 15} more")
+        for name, etype in entities.get("clinical", []):
+            out(f"  - {name} ({etype})")
+        remaining = entities.get("clinical_total", 0) - CLINICAL_SAMPLE_SIZE
+        if remaining > 0:
+            out(f"  ... and {remaining} more")
     
     # Semantic entities by disorder
-    print("\n" + "-" * 75)
-    print("SEMANTIC ENTITIES BY DISORDER:")
-    print("-" * 75)
+    out("\n" + "-" * 75)
+    out("SEMANTIC ENTITIES BY DISORDER:")
+    out("-" * 75)
     
-    for disorder in by_disorder.keys():
-        print(f"\n{disorder}:")
-        all_semantic = set()
-        for episode, (ep_disorder, _) in CONVERSATION_DISORDERS.items():
-            if ep_disorder == disorder and episode in semantic_by_ep:
-                for name, etype in semantic_by_ep[episode]:
-                    all_semantic.add((name, etype))
+    for disorder in summary:
+        out(f"\n{disorder}:")
+        entities = entities_by_disorder.get(disorder, {})
         
-        for name, etype in sorted(all_semantic)[:10]:
-            print(f"  - {name} ({etype})")
-        if len(all_semantic) > 10:
-            print(f"  ... and {len(all_semantic) - 10} more")
+        for name, etype in entities.get("semantic", []):
+            out(f"  - {name} ({etype})")
+        remaining = entities.get("semantic_total", 0) - SEMANTIC_SAMPLE_SIZE
+        if remaining > 0:
+            out(f"  ... and {remaining} more")
     
     # Sample relationships
-    print("\n" + "-" * 75)
-    print("SAMPLE RELATIONSHIPS BY DISORDER:")
-    print("-" * 75)
+    out("\n" + "-" * 75)
+    out("SAMPLE RELATIONSHIPS BY DISORDER:")
+    out("-" * 75)
     
-    for disorder in by_disorder.keys():
-        print(f"\n{disorder}:")
-        for episode, (ep_disorder, _) in CONVERSATION_DISORDERS.items():
-            if ep_disorder == disorder and episode in rels_by_ep:
+    for disorder in summary:
+        out(f"\n{disorder}:")
+        for episode in episodes_by_disorder.get(disorder, []):
+            if episode in rels_by_ep:
                 for rel in rels_by_ep[episode][:5]:
-                    desc = rel['description'][:50] + "..." if rel['description'] and len(rel['description']) > 50 else rel['description']
-                    print(f"  {rel['from']} --[{rel['type']}]--> {rel['to']}")
+                    desc = rel.description[:50] + "..." if rel.description and len(rel.description) > 50 else rel.description
+                    out(f"  {rel.source} --[{rel.type}]--> {rel.target}")
                     if desc:
-                        print(f"      \"{desc}\"")
+                        out(f"      \"{desc}\"")
                 break
     
     # Key findings
-    print("\n" + "=" * 75)
-    print("KEY METRICS FOR DISORDER DIFFERENTIATION:")
-    print("=" * 75)
-    
-    # Calculate summary stats
-    summary = {}
-    for disorder, data in by_disorder.items():
-        avg_clinical = sum(data["clinical_counts"]) / len(data["clinical_counts"]) if data["clinical_counts"] else 0
-        avg_semantic = sum(data["semantic_counts"]) / len(data["semantic_counts"]) if data["semantic_counts"] else 0
-        avg_total = avg_clinical + avg_semantic
-        avg_ratio = avg_clinical / avg_total if avg_total > 0 else 0
-        avg_clin_dens = sum(data["clinical_densities"]) / len(data["clinical_densities"]) if data["clinical_densities"] else 0
-        avg_sem_dens = sum(data["semantic_densities"]) / len(data["semantic_densities"]) if data["semantic_densities"] else 0
-        avg_cross_dens = sum(data["cross_densities"]) / len(data["cross_densities"]) if data["cross_densities"] else 0
-        summary[disorder] = {
-            "clinical": avg_clinical, "semantic": avg_semantic, "ratio": avg_ratio,
-            "clin_dens": avg_clin_dens, "sem_dens": avg_sem_dens, "cross_dens": avg_cross_dens
-        }
+    out("\n" + "=" * 75)
+    out("KEY METRICS FOR DISORDER DIFFERENTIATION:")
+    out("=" * 75)
     
-    print("""
+    out("""
 NODE COUNTS:
                         Clinical   Semantic   Clinical Ratio
                         Nodes      Nodes      (higher = more clinical)
   -------------------------------------------------------------""")
     for disorder, s in summary.items():
-        print(f"  {disorder:<20} {s['clinical']:>6.1f}     {s['semantic']:>6.1f}       {s['ratio']:>6.1%}")
+        out(f"  {disorder:<20} {s['avg_clinical']:>6.1f}     {s['avg_semantic']:>6.1f}       {s['avg_ratio']:>6.1%}")
     
-    print("""
+    out("""
 
 DENSITY BY CONNECTION TYPE:
                         Clinical   Semantic   Cross-type
                         Density    Density    Density
   -------------------------------------------------------------""")
     for disorder, s in summary.items():
-        print(f"  {disorder:<20} {s['clin_dens']:>6.3f}     {s['sem_dens']:>6.3f}       {s['cross_dens']:>6.3f}")
+        out(f"  {disorder:<20} {s['avg_clinical_density']:>6.3f}     {s['avg_semantic_density']:>6.3f}       {s['avg_cross_density']:>6.3f}")
     
-    print("""
+    out("""
 INTERPRETATION:
   Node Counts:
     - High clinical ratio = patient describing clear symptoms
@@ -491,9 +573,14 @@ INTERPRETATION:
     - Wernicke's: expect low clinical density (few symptom connections)
 """)
 
+    sys.stdout.write(buf.getvalue())
 
-def export_to_json(overall, entities_per_ep, clinical_by_ep, semantic_by_ep, rels_by_ep, by_disorder):
+
+def export_to_json(overall, entities_per_ep, clinical_by_ep, semantic_by_ep, rels_by_ep, summary, episode_disorders=None):
     """Export all analysis results to a JSON file in the results/ directory."""
+
+    # Use provided episode_disorders or fall back to static CONVERSATION_DISORDERS
+    disorders_map = episode_disorders if episode_disorders else CONVERSATION_DISORDERS
     
     # Create results directory if it doesn't exist
     results_dir = os.path.join(os.path.dirname(__file__), "results")
@@ -513,28 +600,26 @@ def export_to_json(overall, entities_per_ep, clinical_by_ep, semantic_by_ep, rel
             "metrics": entities_per_ep[episode],
             "clinical_entities": [{"name": name, "type": etype} for name, etype in clinical_by_ep.get(episode, [])],
             "semantic_entities": [{"name": name, "type": etype} for name, etype in semantic_by_ep.get(episode, [])],
-            "relationships": rels_by_ep.get(episode, []),
-            "disorder": CONVERSATION_DISORDERS.get(episode, (None, None))[0],
-            "meets_criteria": CONVERSATION_DISORDERS.get(episode, (None, None))[1],
+            "relationships": [
+                {"from": rel.source, "to": rel.target, "type": rel.type, "description": rel.description}
+                for rel in rels_by_ep.get(episode, [])
+            ],
+            "disorder": disorders_map.get(episode, (None, None))[0],
+            "meets_criteria": disorders_map.get(episode, (None, None))[1],
         }
     
     # Aggregated by disorder
-    for disorder, data in by_disorder.items():
-        avg_clinical = sum(data["clinical_counts"]) / len(data["clinical_counts"]) if data["clinical_counts"] else 0
-        avg_semantic = sum(data["semantic_counts"]) / len(data["semantic_counts"]) if data["semantic_counts"] else 0
-        avg_total = avg_clinical + avg_semantic
-        avg_ratio = avg_clinical / avg_total if avg_total > 0 else 0
-        
+    for disorder, s in summary.items():
         export_data["by_disorder"][disorder] = {
-            "episode_count": len(data["episodes"]),
-            "meets_criteria_count": sum(1 for m in data["meets_criteria"] if m),
-            "avg_clinical_entities": round(avg_clinical, 2),
-            "avg_semantic_entities": round(avg_semantic, 2),
-            "avg_clinical_ratio": round(avg_ratio, 4),
-            "avg_relationships": round(sum(data["relationship_counts"]) / len(data["relationship_counts"]), 2) if data["relationship_counts"] else 0,
-            "avg_clinical_density": round(sum(data["clinical_densities"]) / len(data["clinical_densities"]), 4) if data["clinical_densities"] else 0,
-            "avg_semantic_density": round(sum(data["semantic_densities"]) / len(data["semantic_densities"]), 4) if data["semantic_densities"] else 0,
-            "avg_cross_density": round(sum(data["cross_densities"]) / len(data["cross_densities"]), 4) if data["cross_densities"] else 0,
+            "episode_count": s["episode_count"],
+            "meets_criteria_count": s["meets_count"],
+            "avg_clinical_entities": round(s["avg_clinical"], 2),
+            "avg_semantic_entities": round(s["avg_semantic"], 2),
+            "avg_clinical_ratio": round(s["avg_ratio"], 4),
+            "avg_relationships": round(s["avg_relationships"], 2),
+            "avg_clinical_density": round(s["avg_clinical_density"], 4),
+            "avg_semantic_density": round(s["avg_semantic_density"], 4),
+            "avg_cross_density": round(s["avg_cross_density"], 4),
         }
     
     # Save with timestamp
@@ -545,51 +630,163 @@ def export_to_json(overall, entities_per_ep, clinical_by_ep, semantic_by_ep, rel
     with open(filepath, "w") as f:
         json.dump(export_data, f, indent=2)
     
-    # Also save as "latest" for easy access
+    # Also save as "latest" for easy access. Write to a temp file and rename
+    # so the dashboard never reads a partially written file.
     latest_path = os.path.join(results_dir, "analysis_latest.json")
-    with open(latest_path, "w") as f:
+    tmp_path = f"{latest_path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w") as f:
         json.dump(export_data, f, indent=2)
+    os.replace(tmp_path, latest_path)
     
     return filepath
 
 
+def fetch_analysis_data(driver):
+    """Run all analysis reads concurrently and return their results."""
+    # Both relationship queries filter on the same type list; fetch it once
+    rel_types = get_relationship_types(driver)
+
+    # The reads are independent, so run them concurrently; each helper opens
+    # its own session (sessions are not thread-safe, the driver is).
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        # Get dynamic episode disorder mapping from Neo4j
+        episode_disorders_future = executor.submit(get_all_episode_disorders, driver)
+        overall_future = executor.submit(get_overall_stats, driver)
+        episode_stats_future = executor.submit(get_all_episode_stats, driver, rel_types)
+        rels_future = executor.submit(get_relationships_by_episode, driver, rel_types)
+
+        # Per-disorder entity lists need the disorder map; queue them as
+        # soon as it arrives so they overlap with the remaining reads
+        episode_disorders = episode_disorders_future.result()
+        entities_by_disorder_future = executor.submit(
+            get_entities_by_disorder, driver, episode_disorders
+        )
+
+        entities_per_ep, clinical_by_ep, semantic_by_ep = episode_stats_future.result()
+
+        return {
+            "episode_disorders": episode_disorders,
+            "overall": overall_future.result(),
+            "entities_per_ep": entities_per_ep,
+            "clinical_by_ep": clinical_by_ep,
+            "semantic_by_ep": semantic_by_ep,
+            "rels_by_ep": rels_future.result(),
+            "entities_by_disorder": entities_by_disorder_future.result(),
+        }
+
+
+def get_graph_fingerprint(driver):
+    """Return a short string that changes whenever the graph is written to."""
+    with _session(driver) as session:
+        nodes, rels, updated_at = session.run(GRAPH_FINGERPRINT_QUERY).single()
+    return f"{nodes}-{rels}-{updated_at or 0}"
+
+
+def _cache_path(fingerprint):
+    """Cache file for a graph state."""
+    return os.path.join(CACHE_DIR, f"analysis-v{CACHE_VERSION}-{fingerprint}.pkl")
+
+
+def load_cached_data(fingerprint):
+    """Load cached query results for this graph state, or None on a miss."""
+    path = _cache_path(fingerprint)
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        # Missing or truncated (e.g. interrupted save): just re-query
+        return None
+
+
+def save_cached_data(fingerprint, data):
+    """Cache query results for this graph state, dropping entries for older states."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(fingerprint)
+    # Write to a temp file and rename so an interrupted save leaves no
+    # truncated cache behind
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f)
+    os.replace(tmp_path, path)
+
+    # Any other snapshot describes a graph that no longer exists
+    for name in os.listdir(CACHE_DIR):
+        stale = os.path.join(CACHE_DIR, name)
+        if name.startswith("analysis-") and name.endswith(".pkl") and stale != path:
+            os.remove(stale)
+
+
+def run_analysis(driver, use_cache=False, quiet=False, export_lock=None):
+    """
+    Fetch the analysis data, print the report (unless quiet) and export it
+    to results/. Returns the exported JSON path, or None if the graph is empty.
+    export_lock, if given, is held while the results files are written.
+    """
+    # Gather data. With use_cache, reuse the results of a previous run
+    # if the graph fingerprint (counts + last episode write) is unchanged.
+    data = None
+    if use_cache:
+        fingerprint = get_graph_fingerprint(driver)
+        data = load_cached_data(fingerprint)
+        if data is not None and not quiet:
+            print("Using cached query results.\n")
+    if data is None:
+        data = fetch_analysis_data(driver)
+        if use_cache:
+            save_cached_data(fingerprint, data)
+
+    episode_disorders = data["episode_disorders"]
+    overall = data["overall"]
+    entities_per_ep = data["entities_per_ep"]
+    clinical_by_ep = data["clinical_by_ep"]
+    semantic_by_ep = data["semantic_by_ep"]
+    rels_by_ep = data["rels_by_ep"]
+    entities_by_disorder = data["entities_by_disorder"]
+
+    if overall["total_entities"] == 0:
+        return None
+
+    # Aggregate once; the report and the export share the same summary
+    summary = summarize_by_disorder(analyze_by_disorder(entities_per_ep, episode_disorders))
+
+    if not quiet:
+        print_analysis(overall, entities_per_ep, entities_by_disorder, rels_by_ep, summary, episode_disorders)
+
+    # Export to JSON
+    with export_lock or nullcontext():
+        return export_to_json(overall, entities_per_ep, clinical_by_ep, semantic_by_ep, rels_by_ep, summary, episode_disorders)
+
+
 def main():
     """Run the analysis."""
+    use_cache = "--cached" in sys.argv[1:]
+
     print("\nConnecting to Neo4j...")
     driver = get_driver()
 
     try:
-        with driver.session() as session:
+        with _session(driver) as session:
             session.run("RETURN 1")
         print("Connected!\n")
 
-        # Get dynamic episode disorder mapping from Neo4j
-        episode_disorders = get_all_episode_disorders(driver)
-
-        # Gather data
-        overall = get_overall_stats(driver)
-        entities_per_ep = get_entities_per_episode(driver)
-        clinical_by_ep = get_clinical_entities_by_episode(driver)
-        semantic_by_ep = get_semantic_entities_by_episode(driver)
-        rels_by_ep = get_relationships_by_episode(driver)
+        # The analysis queries seek on Episode/Entity names; the index DDL
+        # lives with the write path in extract_clinical.py
+        from extract_clinical import ensure_indexes
+        ensure_indexes(driver)
 
-        if overall["total_entities"] == 0:
+        json_path = run_analysis(driver, use_cache=use_cache)
+        if json_path is None:
             print("No data found in the graph!")
             print("Run 'python extract_clinical.py all' first to extract entities.")
             return
 
-        print_analysis(overall, entities_per_ep, clinical_by_ep, semantic_by_ep, rels_by_ep, episode_disorders)
-
-        # Export to JSON
-        by_disorder = analyze_by_disorder(entities_per_ep, episode_disorders)
-        json_path = export_to_json(overall, entities_per_ep, clinical_by_ep, semantic_by_ep, rels_by_ep, by_disorder, episode_disorders)
         print(f"\n{'=' * 75}")
         print(f"Results exported to: {json_path}")
         print(f"Also saved as: results/analysis_latest.json")
         print(f"{'=' * 75}")
 
     finally:
-        driver.close()
+        close_driver()
 
 
 if __name__ == "__main__":
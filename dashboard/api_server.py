@@ -18,12 +18,27 @@ import os
 import sys
 import json
 import uuid
+import hashlib
+import gzip
+import time
+import functools
 import threading
-import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import traceback
 from urllib.parse import urlparse, parse_qs
 from io import BytesIO
 import re
+import requests
+from dotenv import load_dotenv
+
+# orjson is optional; it is several times faster than json for both directions
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+load_dotenv()
 
 # Add parent directory to path for imports
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -31,14 +46,172 @@ sys.path.insert(0, parent_dir)
 
 PORT = 8000
 
+# Browser cache lifetime for static dashboard assets; anything else static
+# (HTML, results JSON) is revalidated on every load via If-Modified-Since
+STATIC_MAX_AGE = 300
+STATIC_ASSET_EXTENSIONS = {'.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.woff', '.woff2'}
+
+# Uploads larger than this are rejected with 413 before the body is read
+MAX_UPLOAD_BYTES = 256 * 1024 * 1024
+
+# JSON bodies (API responses and static results/*.json) at least this large
+# are gzipped for clients that accept it; level 1 is the fastest setting
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 1
+
+# Seconds a service health probe result is reused (uploads and /api/health)
+PROBE_TTL = 5.0
+
+# Keep-alive HTTP sessions for the Ollama probe, one per thread (probes run on
+# PROBE_EXECUTOR and the health refresher; requests.Session isn't guaranteed
+# to be thread-safe)
+_ollama_local = threading.local()
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password123")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
+
+# Finished jobs stay queryable for JOB_TTL seconds; at most MAX_JOBS are kept
+JOB_TTL = 3600
+MAX_JOBS = 1024
+
+
+class JobStore:
+    """Thread-safe job status registry that forgets old finished jobs."""
+
+    FINISHED = ("complete", "error")
+
+    def __init__(self, max_jobs, ttl):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+
+    def add(self, job_id, job):
+        with self._lock:
+            self._evict()
+            self._jobs[job_id] = job
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            if job.get("status") in self.FINISHED:
+                job["finished_at"] = time.time()
+
+    def get(self, job_id):
+        """Return a snapshot of the job, or None if unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            # Expired jobs are only evicted on add(); hide them until then
+            if job.get("finished_at", time.time()) <= time.time() - self.ttl:
+                del self._jobs[job_id]
+                return None
+            return dict(job)
+
+    def _evict(self):
+        # Drop expired finished jobs, then the oldest finished ones over the cap;
+        # running jobs are never dropped
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.get("finished_at", cutoff + 1) <= cutoff:
+                del self._jobs[job_id]
+        if len(self._jobs) >= self.max_jobs:
+            for job_id, job in list(self._jobs.items()):
+                if len(self._jobs) < self.max_jobs:
+                    break
+                if "finished_at" in job:
+                    del self._jobs[job_id]
+
+
 # Job status tracking
-jobs = {}
+jobs = JobStore(MAX_JOBS, JOB_TTL)
+
+# Transcript jobs run on a fixed pool; beyond MAX_QUEUED_JOBS waiting jobs,
+# uploads are refused with 503 instead of piling up threads
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "64"))
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_job_slots = threading.BoundedSemaphore(JOB_WORKERS + MAX_QUEUED_JOBS)
+
+# Threads serving HTTP connections; more connections wait in the pool's queue
+REQUEST_WORKERS = int(os.getenv("REQUEST_WORKERS", "64"))
+
+# Serializes in-process analysis runs, see process_transcript_background()
+_analysis_lock = threading.Lock()
+
+# Parsed results/analysis_latest.json keyed by (mtime_ns, size), see _load_latest()
+_latest_cache = {"key": None, "data": None, "bytes": None, "summed": False}
+_latest_lock = threading.Lock()
+
+# blake2b digests of recently merged JSON uploads -> analysis_latest.json's
+# (mtime_ns, size) right after that merge, see find_merged_upload()
+MERGE_CACHE_SIZE = 32
+_merged_uploads = OrderedDict()
+
+# Gzipped static .json files: path -> ((mtime_ns, size), bytes), see send_head().
+# Only the most recently served few are kept (every analysis run adds a new
+# timestamped results file).
+GZIP_CACHE_SIZE = 4
+_gzip_cache = OrderedDict()
+_gzip_cache_lock = threading.Lock()
+
+# Shared Neo4j driver (owns the connection pool), see get_driver()
+_driver = None
+_driver_lock = threading.Lock()
+
+
+# Multipart header patterns; part headers are matched as bytes, undecoded
+_BOUNDARY_RE = re.compile(r'boundary=([^\s;]+)')
+_NAME_RE = re.compile(rb'name="([^"]+)"')
+_FILENAME_RE = re.compile(rb'filename="([^"]*)"')
+
+
+def _store_part(result, part):
+    """Parse one multipart part (headers + content) into result."""
+    # Skip the CRLF after the delimiter, then split headers from content
+    start = 2 if part.startswith(b'\r\n') else 0
+    header_end = part.find(b'\r\n\r\n', start)
+    if header_end == -1:
+        return
+    
+    # Parse Content-Disposition header
+    headers = bytes(part[start:header_end])
+    
+    name_match = _NAME_RE.search(headers)
+    if not name_match:
+        return
+    
+    field_name = name_match.group(1).decode('utf-8', errors='ignore')
+    content = bytes(part[header_end + 4:]).rstrip(b'\r\n')
+    
+    # Check if it's a file
+    filename_match = _FILENAME_RE.search(headers)
+    
+    if filename_match:
+        # File field
+        result[field_name] = {
+            'filename': filename_match.group(1).decode('utf-8', errors='ignore'),
+            'content': content
+        }
+    else:
+        # Regular field, left as bytes for the caller to decode if needed
+        result[field_name] = content
 
 
-def parse_multipart(content_type, body):
-    """Parse multipart form data without the deprecated cgi module."""
+def parse_multipart_stream(content_type, fp, content_length, chunk_size=64 * 1024):
+    """
+    Parse multipart form data straight off fp without the deprecated cgi
+    module. The body is read in chunks and never held in memory as a whole;
+    only the parts themselves are accumulated.
+    """
     # Extract boundary from content type
-    boundary_match = re.search(r'boundary=([^\s;]+)', content_type)
+    boundary_match = _BOUNDARY_RE.search(content_type)
     if not boundary_match:
         raise ValueError("No boundary found in Content-Type")
     
@@ -46,168 +219,362 @@ def parse_multipart(content_type, body):
     if boundary.startswith(b'"') and boundary.endswith(b'"'):
         boundary = boundary[1:-1]
     
-    # Split by boundary
-    parts = body.split(b'--' + boundary)
+    # Every delimiter is "\r\n--boundary"; seeding the buffer with CRLF lets
+    # the first one (at the very start of the body) match the same way
+    delimiter = b'\r\n--' + boundary
+    keep = len(delimiter) - 1
     
     result = {}
+    buf = bytearray(b'\r\n')
+    part = None  # None until the first delimiter (skips the preamble)
+    remaining = content_length
     
-    for part in parts:
-        if not part or part == b'--\r\n' or part == b'--':
-            continue
+    while True:
+        chunk = fp.read(min(chunk_size, remaining)) if remaining > 0 else b''
+        remaining -= len(chunk)
+        buf += chunk
         
-        # Remove leading/trailing CRLF
-        part = part.strip(b'\r\n')
-        if not part:
-            continue
-        
-        # Split headers from content
-        if b'\r\n\r\n' in part:
-            headers_section, content = part.split(b'\r\n\r\n', 1)
-        else:
-            continue
+        # Close out every part whose end delimiter is now in the buffer
+        pos = buf.find(delimiter)
+        while pos != -1:
+            if part is not None:
+                part += buf[:pos]
+                _store_part(result, part)
+            part = bytearray()
+            del buf[:pos + len(delimiter)]
+            pos = buf.find(delimiter)
         
-        # Parse Content-Disposition header
-        headers_text = headers_section.decode('utf-8', errors='ignore')
+        if not chunk:
+            break
         
-        name_match = re.search(r'name="([^"]+)"', headers_text)
-        if not name_match:
-            continue
-        
-        field_name = name_match.group(1)
-        
-        # Check if it's a file
-        filename_match = re.search(r'filename="([^"]*)"', headers_text)
-        
-        if filename_match:
-            # File field
-            result[field_name] = {
-                'filename': filename_match.group(1),
-                'content': content.rstrip(b'\r\n')
-            }
-        else:
-            # Regular field
-            result[field_name] = content.rstrip(b'\r\n').decode('utf-8')
+        # Move everything that can't be the start of a delimiter into the part
+        if len(buf) > keep:
+            if part is not None:
+                part += buf[:-keep]
+            del buf[:-keep]
+    
+    # Trailing part: "--" after the closing delimiter has no headers and is
+    # dropped by _store_part; a truncated body keeps what it has
+    if part is not None:
+        part += buf
+        _store_part(result, part)
     
     return result
 
 
+def json_dumps(obj):
+    """Serialize obj to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def json_loads(data):
+    """Parse JSON from bytes or str (raises json.JSONDecodeError either way)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# /api/disorders never changes, so its body is encoded once
+DISORDERS = ["GAD", "ADHD", "Wernicke's Aphasia", "MDD", "OCD", "PTSD", "Other"]
+DISORDERS_JSON = json_dumps(DISORDERS)
+
+
+def _ttl_cache(ttl):
+    """Cache a no-argument function's result for ttl seconds (thread-safe)."""
+    def decorator(func):
+        lock = threading.Lock()
+        cached = {"at": None, "value": None}
+
+        @functools.wraps(func)
+        def wrapper():
+            with lock:
+                now = time.monotonic()
+                if cached["at"] is None or now - cached["at"] >= ttl:
+                    cached["value"] = func()
+                    cached["at"] = now
+                return cached["value"]
+        return wrapper
+    return decorator
+
+
+@_ttl_cache(PROBE_TTL)
 def check_ollama_available():
     """Check if Ollama is running and accessible."""
     try:
-        import requests
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        session = getattr(_ollama_local, "session", None)
+        if session is None:
+            session = _ollama_local.session = requests.Session()
+        response = session.get("http://localhost:11434/api/tags", timeout=5)
         return response.status_code == 200
     except Exception:
         return False
 
 
+def get_driver():
+    """Return the shared Neo4j driver, creating it on first use."""
+    global _driver
+    with _driver_lock:
+        if _driver is None:
+            from neo4j import GraphDatabase
+
+            _driver = GraphDatabase.driver(
+                NEO4J_URI,
+                auth=(NEO4J_USER, NEO4J_PASSWORD),
+                max_connection_pool_size=50,
+                connection_acquisition_timeout=30,
+            )
+        return _driver
+
+
+def close_driver():
+    """Close the shared driver if one was created."""
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+
+
+@_ttl_cache(PROBE_TTL)
 def check_neo4j_available():
     """Check if Neo4j is running and accessible."""
     try:
-        from dotenv import load_dotenv
-        from neo4j import GraphDatabase
-        load_dotenv()
-
-        uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-        user = os.getenv("NEO4J_USER", "neo4j")
-        password = os.getenv("NEO4J_PASSWORD", "password123")
-
-        driver = GraphDatabase.driver(uri, auth=(user, password))
-        with driver.session() as session:
-            session.run("RETURN 1")
-        driver.close()
+        with get_driver().session(database=NEO4J_DATABASE) as session:
+            session.run("RETURN 1").consume()
         return True
     except Exception:
         return False
 
 
+# Runs the two service probes side by side, see check_services()
+PROBE_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="probe")
+
+
+def check_services():
+    """Return (ollama_ok, neo4j_ok), probing both services concurrently."""
+    ollama = PROBE_EXECUTOR.submit(check_ollama_available)
+    neo4j = PROBE_EXECUTOR.submit(check_neo4j_available)
+    return ollama.result(), neo4j.result()
+
+
+# Encoded /api/health body, kept current by refresh_health_forever()
+_health = {"body": None}
+
+
+def refresh_health():
+    """Probe both services, store the /api/health body and return the result."""
+    ollama_ok, neo4j_ok = check_services()
+    _health["body"] = json_dumps({
+        "server": True,
+        "ollama": ollama_ok,
+        "neo4j": neo4j_ok,
+        "ts": time.time()
+    })
+    return ollama_ok, neo4j_ok
+
+
+def refresh_health_forever():
+    """Background loop re-probing the services every PROBE_TTL seconds."""
+    while True:
+        time.sleep(PROBE_TTL)
+        try:
+            refresh_health()
+        except Exception:
+            traceback.print_exc()
+
+
 def process_transcript_background(job_id, content, episode_name, disorder, meets_criteria):
     """Background task to process a transcript."""
     try:
-        jobs[job_id]["status"] = "extracting"
-        jobs[job_id]["step"] = "Extracting entities with LLM..."
+        jobs.update(job_id, status="extracting", step="Extracting entities with LLM...")
 
         # Import the processing function
-        from extract_clinical import extract_entities_llm, store_in_neo4j, get_neo4j_driver
+        from extract_clinical import extract_entities_cached, store_in_neo4j
 
-        # Extract entities using LLM
-        result = extract_entities_llm(content)
+        # Extract entities using LLM (skipped for an already extracted transcript)
+        result = extract_entities_cached(content)
 
         if result is None:
-            jobs[job_id]["status"] = "error"
-            jobs[job_id]["error"] = "LLM extraction failed. Check if Ollama is running."
+            jobs.update(job_id, status="error",
+                        error="LLM extraction failed. Check if Ollama is running.")
             return
 
-        jobs[job_id]["status"] = "storing"
-        jobs[job_id]["step"] = "Storing in Neo4j..."
-        jobs[job_id]["extraction_result"] = {
+        jobs.update(job_id, status="storing", step="Storing in Neo4j...", extraction_result={
             "clinical_count": len(result.get("clinical_entities", [])),
             "semantic_count": len(result.get("semantic_entities", [])),
             "relationship_count": len(result.get("relationships", []))
-        }
+        })
 
         # Store in Neo4j
-        driver = get_neo4j_driver()
-        store_in_neo4j(driver, episode_name, disorder, meets_criteria, result)
-        driver.close()
+        store_in_neo4j(get_driver(), episode_name, disorder, meets_criteria, result)
 
-        jobs[job_id]["status"] = "analyzing"
-        jobs[job_id]["step"] = "Regenerating analysis..."
+        jobs.update(job_id, status="analyzing", step="Regenerating analysis...")
 
-        # Run analyze_graphs.py to regenerate analysis
-        analyze_script = os.path.join(parent_dir, "analyze_graphs.py")
-        subprocess.run([sys.executable, analyze_script],
-                      capture_output=True, cwd=parent_dir)
+        # Regenerate the analysis in-process on the shared driver; one run at
+        # a time since every run rewrites the same results files, and the
+        # export itself under _latest_lock so it can't interleave with a merge
+        import analyze_graphs
+        with _analysis_lock:
+            analyze_graphs.run_analysis(get_driver(), quiet=True, export_lock=_latest_lock)
 
-        jobs[job_id]["status"] = "complete"
-        jobs[job_id]["step"] = "Done!"
+        jobs.update(job_id, status="complete", step="Done!")
 
     except Exception as e:
-        jobs[job_id]["status"] = "error"
-        jobs[job_id]["error"] = str(e)
+        jobs.update(job_id, status="error", error=str(e))
         traceback.print_exc()
 
 
-def merge_json_data(uploaded_data):
-    """Merge uploaded JSON data into the analysis_latest.json."""
+# overall field -> per-episode metrics field, summed by merge_json_data()
+OVERALL_METRICS = (
+    ("total_entities", "total"),
+    ("clinical_entities", "clinical"),
+    ("semantic_entities", "semantic"),
+    ("total_relationships", "relationships"),
+)
+
+
+def _load_latest(latest_path):
+    """
+    Return (data, summed) for analysis_latest.json, reusing the cached copy
+    while the file's mtime and size are unchanged. summed is True when
+    data["overall"] is known to be the sum of its episodes' metrics (i.e. we
+    wrote the file). Call with _latest_lock held.
+    """
+    try:
+        st = os.stat(latest_path)
+    except FileNotFoundError:
+        return {"by_episode": {}, "by_disorder": {}, "overall": {}}, False
+
+    key = (st.st_mtime_ns, st.st_size)
+    if _latest_cache["key"] != key:
+        with open(latest_path, "rb") as f:
+            _latest_cache["bytes"] = f.read()
+        _latest_cache["data"] = json_loads(_latest_cache["bytes"])
+        _latest_cache["key"] = key
+        _latest_cache["summed"] = False
+    return _latest_cache["data"], _latest_cache["summed"]
+
+
+def _add_metrics(overall, ep_data, sign):
+    """
+    Add (sign=1) or remove (sign=-1) one episode's metrics from overall.
+    All-or-nothing: the new totals are computed first, so a bad metric
+    raises without leaving overall partly updated.
+    """
+    if not ep_data:
+        return
+    metrics = ep_data.get("metrics", {})
+    totals = {field: overall[field] + sign * metrics.get(key, 0)
+              for field, key in OVERALL_METRICS}
+    overall.update(totals)
+
+
+def upload_digest(raw):
+    """Fingerprint of an uploaded JSON body, see find_merged_upload()."""
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+def find_merged_upload(digest):
+    """
+    Return the episode count if the upload with this digest was the last
+    thing merged into analysis_latest.json (re-merging it would change
+    nothing), otherwise None.
+    """
+    latest_path = os.path.join(parent_dir, "results", "analysis_latest.json")
+    with _latest_lock:
+        key = _merged_uploads.get(digest)
+        if key is None or key != _latest_cache["key"]:
+            return None
+        try:
+            st = os.stat(latest_path)
+        except FileNotFoundError:
+            return None
+        if (st.st_mtime_ns, st.st_size) != key:
+            return None
+        return len(_latest_cache["data"]["by_episode"])
+
+
+def upload_error(data):
+    """
+    Return why an uploaded analysis can't be merged, or None if it can. The
+    metrics summed into overall must be numbers.
+    """
+    if not isinstance(data, dict) or 'by_episode' not in data:
+        return "Invalid JSON structure: missing 'by_episode' field"
+    if not isinstance(data['by_episode'], dict):
+        return "Invalid JSON structure: 'by_episode' must be an object"
+    for name, ep_data in data['by_episode'].items():
+        if not ep_data:
+            continue
+        metrics = ep_data.get("metrics", {}) if isinstance(ep_data, dict) else None
+        if not isinstance(metrics, dict):
+            return f"Invalid JSON structure: episode '{name}' has no 'metrics' object"
+        for _, key in OVERALL_METRICS:
+            value = metrics.get(key, 0)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return f"Invalid metric '{key}' for episode '{name}': expected a number"
+    return None
+
+
+def merge_json_data(uploaded_data, digest=None):
+    """
+    Merge uploaded JSON data into the analysis_latest.json. digest (from
+    upload_digest()) lets an identical re-upload skip the merge.
+    """
     results_dir = os.path.join(parent_dir, "results")
     latest_path = os.path.join(results_dir, "analysis_latest.json")
 
-    # Load existing data
-    existing_data = {"by_episode": {}, "by_disorder": {}, "overall": {}}
-    if os.path.exists(latest_path):
-        with open(latest_path, "r") as f:
-            existing_data = json.load(f)
-
-    # Merge uploaded data
-    if "by_episode" in uploaded_data:
-        existing_data["by_episode"].update(uploaded_data["by_episode"])
-
-    # Recalculate overall stats
-    total_entities = 0
-    clinical_entities = 0
-    semantic_entities = 0
-    total_relationships = 0
-
-    for ep_data in existing_data.get("by_episode", {}).values():
-        metrics = ep_data.get("metrics", {})
-        total_entities += metrics.get("total", 0)
-        clinical_entities += metrics.get("clinical", 0)
-        semantic_entities += metrics.get("semantic", 0)
-        total_relationships += metrics.get("relationships", 0)
-
-    existing_data["overall"] = {
-        "total_entities": total_entities,
-        "clinical_entities": clinical_entities,
-        "semantic_entities": semantic_entities,
-        "total_relationships": total_relationships,
-        "episodes": len(existing_data.get("by_episode", {}))
-    }
-
-    # Save merged data
-    os.makedirs(results_dir, exist_ok=True)
-    with open(latest_path, "w") as f:
-        json.dump(existing_data, f, indent=2)
+    # Serialize read-modify-write so concurrent uploads don't lose episodes
+    with _latest_lock:
+        # Load existing data. The cached copy is never modified in place: the
+        # merge builds new by_episode/overall dicts and they only replace the
+        # cached ones once the file has been written.
+        existing_data, summed = _load_latest(latest_path)
+        old_by_episode = existing_data["by_episode"]
+        uploaded = uploaded_data.get("by_episode", {})
+
+        if summed:
+            # Totals already match by_episode: only apply the changed episodes
+            overall = dict(existing_data["overall"])
+            for name, ep_data in uploaded.items():
+                _add_metrics(overall, old_by_episode.get(name), -1)
+                _add_metrics(overall, ep_data, 1)
+            by_episode = dict(old_by_episode)
+            by_episode.update(uploaded)
+        else:
+            # Totals came from elsewhere (e.g. analyze_graphs.py): rebuild once
+            by_episode = dict(old_by_episode)
+            by_episode.update(uploaded)
+            overall = {field: 0 for field, _ in OVERALL_METRICS}
+            for ep_data in by_episode.values():
+                _add_metrics(overall, ep_data, 1)
+        overall["episodes"] = len(by_episode)
+        existing_data = dict(existing_data, by_episode=by_episode, overall=overall)
+
+        # Save merged data (compact: this file is read by code, not people).
+        # Re-uploads of identical results leave the file untouched.
+        new_bytes = json_dumps(existing_data)
+        if new_bytes != _latest_cache["bytes"] or not os.path.exists(latest_path):
+            # Write to a temp file and rename so readers never see a partial file
+            os.makedirs(results_dir, exist_ok=True)
+            tmp_path = f"{latest_path}.tmp.{os.getpid()}"
+            with open(tmp_path, "wb") as f:
+                f.write(new_bytes)
+            os.replace(tmp_path, latest_path)
+
+        st = os.stat(latest_path)
+        _latest_cache["key"] = (st.st_mtime_ns, st.st_size)
+        _latest_cache["bytes"] = new_bytes
+
+        if digest is not None:
+            _merged_uploads[digest] = _latest_cache["key"]
+            _merged_uploads.move_to_end(digest)
+            while len(_merged_uploads) > MERGE_CACHE_SIZE:
+                _merged_uploads.popitem(last=False)
+        _latest_cache["data"] = existing_data
+        _latest_cache["summed"] = True
 
     return existing_data
 
@@ -215,13 +582,87 @@ def merge_json_data(uploaded_data):
 class APIRequestHandler(http.server.SimpleHTTPRequestHandler):
     """HTTP request handler with API endpoints."""
 
+    # Flush small JSON responses immediately instead of waiting on Nagle
+    disable_nagle_algorithm = True
+
+    # Drop connections idle for this long so slow or idle clients can't tie
+    # up the fixed REQUEST_WORKERS pool (applied as the socket timeout)
+    timeout = 30
+
     def end_headers(self):
         # Add CORS headers
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+
+        # Caching for static files
+        path = urlparse(self.path).path
+        if self.command in ('GET', 'HEAD') and not path.startswith('/api/'):
+            if os.path.splitext(path)[1].lower() in STATIC_ASSET_EXTENSIONS:
+                self.send_header('Cache-Control', f'public, max-age={STATIC_MAX_AGE}')
+            else:
+                self.send_header('Cache-Control', 'no-cache')
+            if path.endswith('.json'):
+                self.send_header('Vary', 'Accept-Encoding')
         super().end_headers()
 
+    def accepts_gzip(self):
+        """Whether the client accepts gzip-encoded responses."""
+        return 'gzip' in self.headers.get('Accept-Encoding', '')
+
+    def send_head(self):
+        """Serve static .json files gzipped to clients that accept it."""
+        path = self.translate_path(self.path)
+        if not path.endswith('.json') or not self.accepts_gzip():
+            return super().send_head()
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return super().send_head()
+
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_size < GZIP_MIN_BYTES:
+                return super().send_head()
+
+            last_modified = self.date_time_string(st.st_mtime)
+            if self.headers.get('If-Modified-Since') == last_modified:
+                self.send_response(304)
+                self.end_headers()
+                return None
+
+            # Compress each version of the file once
+            key = (st.st_mtime_ns, st.st_size)
+            with _gzip_cache_lock:
+                cached = _gzip_cache.get(path)
+                if cached is not None:
+                    _gzip_cache.move_to_end(path)
+            if cached is None or cached[0] != key:
+                cached = (key, gzip.compress(f.read(), compresslevel=GZIP_LEVEL))
+                with _gzip_cache_lock:
+                    _gzip_cache[path] = cached
+                    _gzip_cache.move_to_end(path)
+                    while len(_gzip_cache) > GZIP_CACHE_SIZE:
+                        _gzip_cache.popitem(last=False)
+
+        body = cached[1]
+        self.send_response(200)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        return BytesIO(body)
+
+    def copyfile(self, source, outputfile):
+        """
+        Send static files with sendfile (kernel copy) where possible.
+        socket.sendfile() also waits out the non-blocking mode the handler
+        timeout puts the socket in, and falls back to send() for in-memory
+        bodies.
+        """
+        self.connection.sendfile(source, source.tell())
+
     def do_OPTIONS(self):
         """Handle CORS preflight requests."""
         self.send_response(200)
@@ -261,38 +702,53 @@ class APIRequestHandler(http.server.SimpleHTTPRequestHandler):
         else:
             self.send_error(404, "Endpoint not found")
 
-    def handle_health_check(self):
-        """Return service health status."""
-        health = {
-            "server": True,
-            "ollama": check_ollama_available(),
-            "neo4j": check_neo4j_available()
-        }
-
-        self.send_response(200)
+    def send_json(self, body, status=200):
+        """Send an already-encoded JSON body, gzipped if large and accepted."""
+        self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Vary', 'Accept-Encoding')
+        if len(body) >= GZIP_MIN_BYTES and self.accepts_gzip():
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(health).encode())
+        self.wfile.write(body)
+
+    def handle_health_check(self):
+        """Return the last known service health status (see "ts" for its age)."""
+        if _health["body"] is None:
+            refresh_health()
+        self.send_json(_health["body"])
 
     def handle_disorders(self):
         """Return list of available disorders."""
-        disorders = ["GAD", "ADHD", "Wernicke's Aphasia", "MDD", "OCD", "PTSD", "Other"]
-
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(disorders).encode())
+        self.send_json(DISORDERS_JSON)
 
     def handle_status(self, job_id):
         """Return job status."""
-        if job_id not in jobs:
+        job = jobs.get(job_id)
+        if job is None:
             self.send_error(404, "Job not found")
             return
 
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(jobs[job_id]).encode())
+        self.send_json(json_dumps(job))
+
+    def read_content_length(self):
+        """
+        Return the request's Content-Length, or None after replying 400 if
+        it isn't a non-negative integer or 413 if it is too large.
+        """
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self.send_error(400, "Invalid Content-Length")
+            return None
+        if content_length > MAX_UPLOAD_BYTES:
+            self.send_error(413, f"Upload exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit")
+            return None
+        return content_length
 
     def handle_transcript_upload(self):
         """Handle transcript file upload."""
@@ -300,19 +756,18 @@ class APIRequestHandler(http.server.SimpleHTTPRequestHandler):
             # Parse multipart form data
             content_type = self.headers.get('Content-Type', '')
 
+            content_length = self.read_content_length()
+            if content_length is None:
+                return
+
             if 'multipart/form-data' in content_type:
-                # Read body
-                content_length = int(self.headers.get('Content-Length', 0))
-                body = self.rfile.read(content_length)
-                
-                # Parse multipart form
-                form = parse_multipart(content_type, body)
+                # Parse multipart form straight off the socket
+                form = parse_multipart_stream(content_type, self.rfile, content_length)
 
                 # Extract form fields
-                episode_name = form.get('episode_name', '')
-                disorder = form.get('disorder', '')
-                meets_criteria_val = form.get('meets_criteria', 'false')
-                meets_criteria = str(meets_criteria_val).lower() == 'true'
+                episode_name = form.get('episode_name', b'').decode('utf-8')
+                disorder = form.get('disorder', b'').decode('utf-8')
+                meets_criteria = form.get('meets_criteria', b'false').lower() == b'true'
 
                 # Get file content
                 file_data = form.get('file')
@@ -322,9 +777,7 @@ class APIRequestHandler(http.server.SimpleHTTPRequestHandler):
                     raise ValueError("No file uploaded")
             else:
                 # Parse JSON body
-                content_length = int(self.headers.get('Content-Length', 0))
-                body = self.rfile.read(content_length).decode('utf-8')
-                data = json.loads(body)
+                data = json_loads(self.rfile.read(content_length))
 
                 episode_name = data.get('episode_name', '')
                 disorder = data.get('disorder', '')
@@ -343,36 +796,39 @@ class APIRequestHandler(http.server.SimpleHTTPRequestHandler):
                 return
 
             # Check services availability
-            if not check_ollama_available():
+            ollama_ok, neo4j_ok = check_services()
+            if not ollama_ok:
                 self.send_error(503, "Ollama is not available. Please start Ollama first.")
                 return
-            if not check_neo4j_available():
+            if not neo4j_ok:
                 self.send_error(503, "Neo4j is not available. Please start Neo4j first.")
                 return
 
+            # Reserve a slot (running or queued) before accepting the job
+            if not _job_slots.acquire(blocking=False):
+                self.send_error(503, "Too many transcripts being processed. Please retry later.")
+                return
+
             # Create job
             job_id = str(uuid.uuid4())
-            jobs[job_id] = {
+            jobs.add(job_id, {
                 "id": job_id,
                 "status": "queued",
                 "step": "Starting...",
                 "episode_name": episode_name,
                 "disorder": disorder,
                 "meets_criteria": meets_criteria
-            }
+            })
 
-            # Start background processing
-            thread = threading.Thread(
-                target=process_transcript_background,
-                args=(job_id, content, episode_name, disorder, meets_criteria)
+            # Start background processing; the slot frees when the job ends
+            future = JOB_EXECUTOR.submit(
+                process_transcript_background,
+                job_id, content, episode_name, disorder, meets_criteria
             )
-            thread.start()
+            future.add_done_callback(lambda _: _job_slots.release())
 
             # Return job ID
-            self.send_response(202)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"job_id": job_id}).encode())
+            self.send_json(json_dumps({"job_id": job_id}), 202)
 
         except Exception as e:
             traceback.print_exc()
@@ -383,42 +839,45 @@ class APIRequestHandler(http.server.SimpleHTTPRequestHandler):
         try:
             content_type = self.headers.get('Content-Type', '')
 
+            content_length = self.read_content_length()
+            if content_length is None:
+                return
+
             if 'multipart/form-data' in content_type:
-                # Read body
-                content_length = int(self.headers.get('Content-Length', 0))
-                body = self.rfile.read(content_length)
-                
-                # Parse multipart form
-                form = parse_multipart(content_type, body)
+                # Parse multipart form straight off the socket
+                form = parse_multipart_stream(content_type, self.rfile, content_length)
 
                 # Get file content
                 file_data = form.get('file')
                 if file_data and isinstance(file_data, dict) and 'content' in file_data:
-                    content = file_data['content'].decode('utf-8')
-                    data = json.loads(content)
+                    raw = file_data['content']
                 else:
                     raise ValueError("No file uploaded")
             else:
+                raw = self.rfile.read(content_length)
+
+            # An identical re-upload (e.g. a retried submit) is already merged
+            digest = upload_digest(raw)
+            episodes_count = find_merged_upload(digest)
+
+            if episodes_count is None:
                 # Parse JSON body
-                content_length = int(self.headers.get('Content-Length', 0))
-                body = self.rfile.read(content_length).decode('utf-8')
-                data = json.loads(body)
+                data = json_loads(raw)
 
-            # Validate structure
-            if 'by_episode' not in data:
-                self.send_error(400, "Invalid JSON structure: missing 'by_episode' field")
-                return
+                # Validate structure
+                error = upload_error(data)
+                if error:
+                    self.send_error(400, error)
+                    return
 
-            # Merge data
-            merged = merge_json_data(data)
+                # Merge data
+                merged = merge_json_data(data, digest)
+                episodes_count = len(merged.get("by_episode", {}))
 
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({
+            self.send_json(json_dumps({
                 "success": True,
-                "episodes_count": len(merged.get("by_episode", {}))
-            }).encode())
+                "episodes_count": episodes_count
+            }))
 
         except json.JSONDecodeError as e:
             self.send_error(400, f"Invalid JSON: {str(e)}")
@@ -428,6 +887,10 @@ class APIRequestHandler(http.server.SimpleHTTPRequestHandler):
 
     def log_message(self, format, *args):
         """Custom logging format."""
+        # send_error() logs through here with (code, message) before the
+        # request line is logged; that line already carries the status
+        if not args or not isinstance(args[0], str):
+            return
         method = args[0].split()[0] if args else "?"
         path = args[0].split()[1] if args and len(args[0].split()) > 1 else "?"
         status = args[1] if len(args) > 1 else "?"
@@ -438,8 +901,26 @@ class APIRequestHandler(http.server.SimpleHTTPRequestHandler):
 
 
 class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    """Threaded TCP server to handle multiple requests."""
+    """
+    Threaded TCP server to handle multiple requests. Connections run on a
+    fixed-size pool of reused threads instead of a new thread each.
+    """
     allow_reuse_address = True
+    # Deeper accept backlog so bursts of refreshes + uploads aren't refused
+    request_queue_size = 256
+
+    def __init__(self, *args, **kwargs):
+        self.request_executor = ThreadPoolExecutor(max_workers=REQUEST_WORKERS,
+                                                   thread_name_prefix="request")
+        super().__init__(*args, **kwargs)
+
+    def process_request(self, request, client_address):
+        # process_request_thread() handles errors and closes the socket
+        self.request_executor.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.request_executor.shutdown(wait=False)
 
 
 def main():
@@ -469,17 +950,29 @@ def main():
 
         # Check service availability
         print("Checking services...")
-        ollama_ok = check_ollama_available()
-        neo4j_ok = check_neo4j_available()
+        ollama_ok, neo4j_ok = refresh_health()
+        threading.Thread(target=refresh_health_forever, daemon=True).start()
         print(f"  Ollama: {'OK' if ollama_ok else 'NOT AVAILABLE'}")
         print(f"  Neo4j:  {'OK' if neo4j_ok else 'NOT AVAILABLE'}")
         print()
 
+        # Uploads write through store_in_neo4j(); make sure its indexes exist
+        if neo4j_ok:
+            from extract_clinical import ensure_indexes
+            ensure_indexes(get_driver())
+
+        # Load the extraction model now rather than on the first upload
+        if ollama_ok:
+            from extract_clinical import preload_model
+            threading.Thread(target=preload_model, daemon=True).start()
+
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("\n\nServer stopped.")
             sys.exit(0)
+        finally:
+            close_driver()
 
 
 if __name__ == "__main__":
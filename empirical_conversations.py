@@ -1080,6 +1080,9 @@ Byron: Yeah.
     },
 ]
 
+# Conversations keyed by name for direct lookup
+CONVERSATIONS_BY_NAME = {conv["name"]: conv for conv in CONVERSATIONS}
+
 
 # Summary statistics for the dataset
 DATASET_SUMMARY = """
@@ -14,27 +14,55 @@ Entity Types:
     SEMANTIC: people, places, objects, topics, abstract concepts
 """
 
+import hashlib
 import json
+import logging
 import os
+import re
 import sys
+import threading
 import requests
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from neo4j import GraphDatabase
 
 load_dotenv()
 
+# The driver's INFO/DEBUG chatter (connection pool events, notifications)
+# is not useful in a batch run
+logging.getLogger("neo4j").setLevel(logging.WARNING)
+
 # Configuration
 OLLAMA_URL = "http://localhost:11434/api/generate"
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+# Concurrent extraction requests in extract_all(); match the server's
+# OLLAMA_NUM_PARALLEL so requests run in parallel slots instead of queueing
+OLLAMA_NUM_PARALLEL = max(1, int(os.getenv("OLLAMA_NUM_PARALLEL", "1")))
+
+# Keep-alive HTTP sessions for Ollama calls, one per thread (extract_all()
+# and the API server's job pool call in from several threads, and a
+# requests.Session isn't guaranteed to be thread-safe); see get_ollama_session()
+_ollama_local = threading.local()
+
+# LLM extraction results, one JSON file per model + prompt hash, so a
+# transcript that was already extracted skips the LLM; see extract_entities_cached()
+EXTRACTION_CACHE_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "chat2graph",
+    "extractions",
+)
 
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password123")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "neo4j")
 
-# Import conversation data
-from empirical_conversations import CONVERSATIONS
+# Shared driver (owns the connection pool), see get_neo4j_driver()
+_driver = None
 
-CONVERSATIONS_BY_NAME = {conv['name']: conv for conv in CONVERSATIONS}
+# Import conversation data
+from empirical_conversations import CONVERSATIONS, CONVERSATIONS_BY_NAME
 
 # Extraction prompt
 EXTRACTION_PROMPT = """You are a clinical entity extractor. Analyze this mental health interview transcript and extract entities and relationships.
@@ -81,9 +109,82 @@ INTERVIEW TRANSCRIPT:
 JSON OUTPUT:"""
 
 
+# Anything that is not a plain identifier character in an LLM-supplied
+# relationship type; such runs collapse to "_" (see normalize_rel_type)
+_REL_TYPE_JUNK = re.compile(r"[^A-Z0-9_]+")
+
+
+def normalize_rel_type(value):
+    """
+    Turn an LLM-supplied relationship type into a safe, stable Cypher type,
+    e.g. "has symptom" / "Has-Symptom" -> "HAS_SYMPTOM".
+    """
+    rel_type = _REL_TYPE_JUNK.sub("_", str(value or "").upper()).strip("_")
+    if not rel_type:
+        return "RELATES_TO"
+    if rel_type[0].isdigit():
+        rel_type = "REL_" + rel_type
+    return rel_type
+
+
+# Indexes behind the MERGE/MATCH lookups in store_in_neo4j() (episodes by
+# name, entities by (name, episode)) and the episode-by-name lookups in
+# analyze_graphs.py
+INDEX_QUERIES = (
+    "CREATE INDEX episode_name IF NOT EXISTS FOR (e:Episode) ON (e.name)",
+    "CREATE INDEX entity_name_episode IF NOT EXISTS FOR (n:Entity) ON (n.name, n.episode)",
+)
+
+
+def ensure_indexes(driver):
+    """Create the indexes the write and analysis queries rely on (no-op if present)."""
+    with driver.session(database=NEO4J_DATABASE) as session:
+        for query in INDEX_QUERIES:
+            session.run(query).consume()
+
+
 def get_neo4j_driver():
-    """Create Neo4j driver."""
-    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    """Get the shared Neo4j driver, creating it on first use."""
+    global _driver
+    if _driver is None:
+        _driver = GraphDatabase.driver(
+            NEO4J_URI,
+            auth=(NEO4J_USER, NEO4J_PASSWORD),
+            max_connection_pool_size=max(32, 2 * (os.cpu_count() or 1)),
+            connection_acquisition_timeout=30,
+            connection_timeout=5,
+            keep_alive=True,
+        )
+    return _driver
+
+
+def close_neo4j_driver():
+    """Close the shared driver if one was created."""
+    global _driver
+    if _driver is not None:
+        _driver.close()
+        _driver = None
+
+
+def get_ollama_session():
+    """Return this thread's Ollama HTTP session, creating it on first use."""
+    session = getattr(_ollama_local, "session", None)
+    if session is None:
+        session = _ollama_local.session = requests.Session()
+    return session
+
+
+def preload_model():
+    """
+    Ask Ollama to load the extraction model into memory, so the first
+    extraction does not also pay for the model load. Returns True on success.
+    """
+    try:
+        # A generate request without a prompt just loads the model
+        response = get_ollama_session().post(OLLAMA_URL, json={"model": OLLAMA_MODEL}, timeout=120)
+        return response.status_code == 200
+    except requests.exceptions.RequestException:
+        return False
 
 
 def extract_entities_llm(transcript):
@@ -91,7 +192,7 @@ def extract_entities_llm(transcript):
     prompt = EXTRACTION_PROMPT.format(transcript=transcript)
     
     try:
-        response = requests.post(
+        response = get_ollama_session().post(
             OLLAMA_URL,
             json={
                 "model": OLLAMA_MODEL,
@@ -135,6 +236,39 @@ def extract_entities_llm(transcript):
         return None
 
 
+def _extraction_cache_path(transcript):
+    """Cache file for a transcript; changes with the model or the prompt."""
+    prompt = EXTRACTION_PROMPT.format(transcript=transcript)
+    digest = hashlib.blake2b(f"{OLLAMA_MODEL}\0{prompt}".encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(EXTRACTION_CACHE_DIR, digest[:2], f"{digest}.json")
+
+
+def extract_entities_cached(transcript):
+    """extract_entities_llm() backed by the on-disk extraction cache."""
+    path = _extraction_cache_path(transcript)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    result = extract_entities_llm(transcript)
+    if result is None:
+        return None
+
+    # Write to a temp file and rename so a concurrent reader never sees a
+    # partial entry; a cache that can't be written just isn't used
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+    return result
+
+
 def store_in_neo4j(driver, episode_name, diagnosis, meets_criteria, extraction_result):
     """Store extracted entities and relationships in Neo4j."""
     
@@ -142,59 +276,56 @@ def store_in_neo4j(driver, episode_name, diagnosis, meets_criteria, extraction_r
     semantic_entities = extraction_result.get("semantic_entities", [])
     relationships = extraction_result.get("relationships", [])
     
-    with driver.session() as session:
+    with driver.session(database=NEO4J_DATABASE) as session:
         # Create Episode node
         session.run("""
             MERGE (e:Episode {name: $name})
             SET e.diagnosis = $diagnosis,
-                e.meets_criteria = $meets_criteria
+                e.meets_criteria = $meets_criteria,
+                e.updated_at = timestamp()
         """, name=episode_name, diagnosis=diagnosis, meets_criteria=meets_criteria)
         
-        # Create Clinical entities
-        for entity in clinical_entities:
-            if entity.get("name"):
-                session.run("""
-                    MERGE (n:Entity:Clinical {name: $name, episode: $episode})
-                    SET n.type = $type
-                """, name=entity["name"], episode=episode_name, type=entity.get("type", "unknown"))
-                
-                # Link to episode
-                session.run("""
-                    MATCH (e:Episode {name: $episode})
-                    MATCH (n:Entity:Clinical {name: $name, episode: $episode})
-                    MERGE (e)-[:MENTIONS]->(n)
-                """, episode=episode_name, name=entity["name"])
-        
-        # Create Semantic entities
-        for entity in semantic_entities:
-            if entity.get("name"):
-                session.run("""
-                    MERGE (n:Entity:Semantic {name: $name, episode: $episode})
-                    SET n.type = $type
-                """, name=entity["name"], episode=episode_name, type=entity.get("type", "unknown"))
-                
-                # Link to episode
-                session.run("""
-                    MATCH (e:Episode {name: $episode})
-                    MATCH (n:Entity:Semantic {name: $name, episode: $episode})
-                    MERGE (e)-[:MENTIONS]->(n)
-                """, episode=episode_name, name=entity["name"])
+        # Create entities and link them to the episode, one batched query
+        # per label (labels cannot be parameterized, values can)
+        for label, entities in (("Clinical", clinical_entities), ("Semantic", semantic_entities)):
+            rows = [
+                {"name": entity["name"], "type": entity.get("type", "unknown")}
+                for entity in entities if entity.get("name")
+            ]
+            if not rows:
+                continue
+            session.run(f"""
+                MATCH (e:Episode {{name: $episode}})
+                UNWIND $rows AS row
+                MERGE (n:Entity:{label} {{name: row.name, episode: $episode}})
+                SET n.type = row.type
+                MERGE (e)-[:MENTIONS]->(n)
+            """, episode=episode_name, rows=rows).consume()
         
-        # Create relationships between entities
+        # Create relationships between entities, one batched query per type.
+        # Types cannot be parameters, so they are normalized to identifiers;
+        # the query text then stays the same for every write of that type.
+        rows_by_type = defaultdict(list)
         for rel in relationships:
             from_name = rel.get("from")
             to_name = rel.get("to")
-            rel_type = rel.get("type", "RELATES_TO").upper().replace(" ", "_")
-            description = rel.get("description", "")
-            
             if from_name and to_name:
-                # Try to find entities (could be clinical or semantic)
-                session.run(f"""
-                    MATCH (a:Entity {{name: $from_name, episode: $episode}})
-                    MATCH (b:Entity {{name: $to_name, episode: $episode}})
-                    MERGE (a)-[r:{rel_type}]->(b)
-                    SET r.description = $description
-                """, from_name=from_name, to_name=to_name, episode=episode_name, description=description)
+                rel_type = normalize_rel_type(rel.get("type"))
+                rows_by_type[rel_type].append({
+                    "from_name": from_name,
+                    "to_name": to_name,
+                    "description": rel.get("description", ""),
+                })
+        
+        for rel_type, rows in rows_by_type.items():
+            # Entities could be clinical or semantic
+            session.run(f"""
+                UNWIND $rows AS row
+                MATCH (a:Entity {{name: row.from_name, episode: $episode}})
+                MATCH (b:Entity {{name: row.to_name, episode: $episode}})
+                MERGE (a)-[r:{rel_type}]->(b)
+                SET r.description = row.description
+            """, episode=episode_name, rows=rows).consume()
     
     return len(clinical_entities), len(semantic_entities), len(relationships)
 
@@ -213,17 +344,15 @@ def process_uploaded_transcript(content, episode_name, disorder, meets_criteria)
         dict with extraction results or None on failure
     """
     # Extract entities using LLM
-    result = extract_entities_llm(content)
+    result = extract_entities_cached(content)
 
     if result is None:
         return None
 
     # Store in Neo4j
-    driver = get_neo4j_driver()
     clinical_count, semantic_count, rel_count = store_in_neo4j(
-        driver, episode_name, disorder, meets_criteria, result
+        get_neo4j_driver(), episode_name, disorder, meets_criteria, result
     )
-    driver.close()
 
     return {
         "episode_name": episode_name,
@@ -273,15 +402,15 @@ def extract_single(conv):
     # Connect to Neo4j
     print("\n[1/3] Connecting to Neo4j...")
     driver = get_neo4j_driver()
+    ensure_indexes(driver)
     print("      Connected")
     
     # Extract entities using LLM
     print("\n[2/3] Extracting entities with LLM...")
-    result = extract_entities_llm(conv['content'])
+    result = extract_entities_cached(conv['content'])
     
     if result is None:
         print("      Extraction failed!")
-        driver.close()
         return
     
     clinical_count = len(result.get("clinical_entities", []))
@@ -294,8 +423,6 @@ def extract_single(conv):
     store_in_neo4j(driver, conv['name'], diagnosis, meets, result)
     print("      Done!")
     
-    driver.close()
-    
     print("\n" + "=" * 65)
     print(f"  COMPLETE: {conv['name']}")
     print("=" * 65)
@@ -324,34 +451,41 @@ def extract_all():
     print("=" * 65)
     
     driver = get_neo4j_driver()
+    ensure_indexes(driver)
     
-    results = []
-    for i, conv in enumerate(CONVERSATIONS):
-        diagnosis = conv.get('diagnosis', 'Unknown')
-        meets = conv.get('meets_criteria', None)
-        meets_str = "meets criteria" if meets else "subthreshold" if meets is False else ""
-        
-        print(f"\n[{i+1}/{len(CONVERSATIONS)}] {conv['name']}")
-        print(f"    {diagnosis} ({meets_str})")
+    # LLM calls dominate; keep up to OLLAMA_NUM_PARALLEL in flight and
+    # store/report the results in order as they complete
+    executor = ThreadPoolExecutor(max_workers=OLLAMA_NUM_PARALLEL)
+    extractions = executor.map(extract_entities_cached, (conv['content'] for conv in CONVERSATIONS))
+    
+    try:
+        results = []
+        for i, (conv, result) in enumerate(zip(CONVERSATIONS, extractions)):
+            diagnosis = conv.get('diagnosis', 'Unknown')
+            meets = conv.get('meets_criteria', None)
+            meets_str = "meets criteria" if meets else "subthreshold" if meets is False else ""
         
-        result = extract_entities_llm(conv['content'])
+            print(f"\n[{i+1}/{len(CONVERSATIONS)}] {conv['name']}")
+            print(f"    {diagnosis} ({meets_str})")
         
-        if result:
-            clinical_count, semantic_count, rel_count = store_in_neo4j(
-                driver, conv['name'], diagnosis, meets, result
-            )
-            print(f"    Extracted: {clinical_count} clinical, {semantic_count} semantic, {rel_count} relationships")
-            results.append({
-                "name": conv['name'],
-                "clinical": clinical_count,
-                "semantic": semantic_count,
-                "relationships": rel_count
-            })
-        else:
-            print("    FAILED")
-            results.append({"name": conv['name'], "clinical": 0, "semantic": 0, "relationships": 0})
-    
-    driver.close()
+            if result:
+                clinical_count, semantic_count, rel_count = store_in_neo4j(
+                    driver, conv['name'], diagnosis, meets, result
+                )
+                print(f"    Extracted: {clinical_count} clinical, {semantic_count} semantic, {rel_count} relationships")
+                results.append({
+                    "name": conv['name'],
+                    "clinical": clinical_count,
+                    "semantic": semantic_count,
+                    "relationships": rel_count
+                })
+            else:
+                print("    FAILED")
+                results.append({"name": conv['name'], "clinical": 0, "semantic": 0, "relationships": 0})
+    finally:
+        # On an error or Ctrl+C, drop the queued LLM calls instead of
+        # letting the workers run them all before the interpreter exits
+        executor.shutdown(wait=False, cancel_futures=True)
     
     # Summary
     print("\n" + "=" * 65)
@@ -378,14 +512,17 @@ def main():
     
     arg = sys.argv[1]
     
-    if arg == "all":
-        extract_all()
-    elif arg in CONVERSATIONS_BY_NAME:
-        extract_single(CONVERSATIONS_BY_NAME[arg])
-    else:
-        print(f"Unknown conversation: {arg}")
-        print()
-        list_conversations()
+    try:
+        if arg == "all":
+            extract_all()
+        elif arg in CONVERSATIONS_BY_NAME:
+            extract_single(CONVERSATIONS_BY_NAME[arg])
+        else:
+            print(f"Unknown conversation: {arg}")
+            print()
+            list_conversations()
+    finally:
+        close_neo4j_driver()
 
 
 if __name__ == "__main__":
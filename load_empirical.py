@@ -28,10 +28,10 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import empirical data
-from empirical_conversations import CONVERSATIONS
+from empirical_conversations import CONVERSATIONS, CONVERSATIONS_BY_NAME
 
-# Build lookup dict
-CONVERSATIONS_BY_NAME = {conv['name']: conv for conv in CONVERSATIONS}
+# Shared Graphiti client, see get_graphiti()
+_graphiti = None
 
 
 def get_llm_client():
@@ -62,6 +62,30 @@ def get_embedder():
     return OpenAIEmbedder(config=config)
 
 
+def get_graphiti():
+    """Return the shared Graphiti client, creating it on first use."""
+    global _graphiti
+    if _graphiti is None:
+        from graphiti_core import Graphiti
+
+        _graphiti = Graphiti(
+            uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+            user=os.getenv("NEO4J_USER", "neo4j"),
+            password=os.getenv("NEO4J_PASSWORD", "password123"),
+            llm_client=get_llm_client(),
+            embedder=get_embedder()
+        )
+    return _graphiti
+
+
+async def close_graphiti():
+    """Close the shared Graphiti client if one was created."""
+    global _graphiti
+    if _graphiti is not None:
+        await _graphiti.close()
+        _graphiti = None
+
+
 def list_conversations():
     """List all available conversations."""
     print("=" * 65)
@@ -83,7 +107,6 @@ def list_conversations():
 
 async def load_single_conversation(conv):
     """Load a single conversation into the knowledge graph."""
-    from graphiti_core import Graphiti
     from graphiti_core.nodes import EpisodeType
     
     diagnosis = conv.get('diagnosis', 'Unknown')
@@ -95,28 +118,16 @@ async def load_single_conversation(conv):
     print(f"  {diagnosis} ({meets_str})")
     print("=" * 65)
     
-    # Setup
-    print("\n[1/3] Setting up AI models...")
-    llm_client = get_llm_client()
-    embedder = get_embedder()
-    print("      Ollama ready")
-    
-    # Connect to Neo4j
-    print("\n[2/3] Connecting to Neo4j...")
-    graphiti = Graphiti(
-        uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
-        user=os.getenv("NEO4J_USER", "neo4j"),
-        password=os.getenv("NEO4J_PASSWORD", "password123"),
-        llm_client=llm_client,
-        embedder=embedder
-    )
+    # Connect to Neo4j (the client is set up with the Ollama models)
+    print("\n[1/2] Connecting to Neo4j...")
+    graphiti = get_graphiti()
     print("      Connected")
     
     # Initialize schema
     await graphiti.build_indices_and_constraints()
     
     # Process the conversation
-    print(f"\n[3/3] Processing conversation...")
+    print(f"\n[2/2] Processing conversation...")
     
     # Build source description with metadata
     source_desc = f"{conv['source_description']} | Diagnosis: {diagnosis}"
@@ -136,7 +147,7 @@ async def load_single_conversation(conv):
         print(f"      Error: {e}")
     
     # Cleanup
-    await graphiti.close()
+    await close_graphiti()
     
     print("\n" + "=" * 65)
     print(f"  COMPLETE: {conv['name']}")
@@ -149,35 +160,22 @@ View in Neo4j:
 
 async def load_all_conversations():
     """Load all conversations into the knowledge graph."""
-    from graphiti_core import Graphiti
     from graphiti_core.nodes import EpisodeType
     
     print("=" * 65)
     print("  Loading All Empirical Clinical Conversations")
     print("=" * 65)
     
-    # Setup
-    print("\n[1/3] Setting up AI models...")
-    llm_client = get_llm_client()
-    embedder = get_embedder()
-    print("      Ollama ready")
-    
-    # Connect to Neo4j
-    print("\n[2/3] Connecting to Neo4j...")
-    graphiti = Graphiti(
-        uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
-        user=os.getenv("NEO4J_USER", "neo4j"),
-        password=os.getenv("NEO4J_PASSWORD", "password123"),
-        llm_client=llm_client,
-        embedder=embedder
-    )
+    # Connect to Neo4j (the client is set up with the Ollama models)
+    print("\n[1/2] Connecting to Neo4j...")
+    graphiti = get_graphiti()
     print("      Connected")
     
     # Initialize schema
     await graphiti.build_indices_and_constraints()
     
     # Process each conversation
-    print(f"\n[3/3] Processing {len(CONVERSATIONS)} conversations...")
+    print(f"\n[2/2] Processing {len(CONVERSATIONS)} conversations...")
     print("-" * 65)
     
     base_time = datetime.now()
@@ -211,7 +209,7 @@ async def load_all_conversations():
             print(f"      Error: {e}")
             results.append({"name": conv['name'], "status": "error"})
     
-    await graphiti.close()
+    await close_graphiti()
     
     success = sum(1 for r in results if r['status'] == 'success')
     print("\n" + "=" * 65)